@@ -0,0 +1,91 @@
+"""
+Benchmark of the Flat parser on the listings of 'test-data/angebote.html'
+
+Reports the parsing throughput (flats/sec) and the bytes allocated per parsed flat.
+
+Usage:
+    python3 benchmarks/flat_parser_benchmark.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "wbmbot_v2"))
+
+import lxml.html
+from handlers import flat
+from httpsWrapper import httpListingPoller
+
+ANGEBOTE_PAGE = os.path.join(ROOT_DIR, "test-data", "angebote.html")
+
+
+def load_listings():
+    """Parse the listing rows of the test Angebote page once."""
+
+    with open(ANGEBOTE_PAGE, "r", encoding="utf-8") as page:
+        document = lxml.html.fromstring(page.read())
+    return httpListingPoller.parse_listings(document, f"file://{ANGEBOTE_PAGE}")
+
+
+def measure_throughput(name: str, parse, listings: list, iterations: int):
+    """Parse every listing 'iterations' times and print the flats/sec."""
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for snapshot in listings:
+            parse(snapshot)
+    elapsed = time.perf_counter() - start
+
+    total = iterations * len(listings)
+    print(f"{name:<22} {total / elapsed:>12,.0f} flats/sec ({total} flats in {elapsed:.3f}s)")
+
+
+def measure_allocations(name: str, parse, listings: list, iterations: int):
+    """Print the bytes allocated while parsing and the bytes kept alive per flat."""
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    kept = [parse(snapshot) for _ in range(iterations) for snapshot in listings]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = len(kept)
+    print(
+        f"{name:<22} {(current - baseline) / total:>12,.0f} bytes kept/flat, "
+        f"{(peak - baseline) / total:,.0f} bytes peak/flat"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--iterations",
+        dest="iterations",
+        type=int,
+        default=2000,
+        help="How many times every listing is parsed. [default: 2000]",
+    )
+    args = parser.parse_args()
+
+    listings = load_listings()
+    print(f"Parsing {len(listings)} listing(s) x {args.iterations} iteration(s)\n")
+
+    parsers = {
+        "Flat(text)": lambda snapshot: flat.Flat(snapshot.text, False),
+        "Flat.from_snapshot": lambda snapshot: flat.Flat.from_snapshot(snapshot, False),
+    }
+    for name, parse in parsers.items():
+        measure_throughput(name, parse, listings, args.iterations)
+    print()
+    for name, parse in parsers.items():
+        measure_allocations(name, parse, listings, max(args.iterations // 10, 1))
+
+
+if __name__ == "__main__":
+    main()
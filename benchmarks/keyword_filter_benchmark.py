@@ -0,0 +1,116 @@
+"""
+Benchmark of the exclude keyword filter on the listings of 'test-data/angebote.html'
+
+Reports the time to match a listing against growing exclude lists, for the KeywordFilter
+and for the loop over the keywords it replaced.
+
+Usage:
+    python3 benchmarks/keyword_filter_benchmark.py [-n ITERATIONS] [-k COUNT [COUNT ...]]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "wbmbot_v2"))
+
+import lxml.html
+from httpsWrapper import httpListingPoller
+from utility import keyword_filter
+
+ANGEBOTE_PAGE = os.path.join(ROOT_DIR, "test-data", "angebote.html")
+
+# Keywords that are in the test listings, so every exclude list matches something
+MATCHING_KEYWORDS = ["wbs", "Friedrichshain", "zimmer"]
+# The few keywords using a rule, added to every exclude list
+RULE_KEYWORDS = ["=bad", "2*zimmer"]
+
+
+def load_texts():
+    """The texts of the listing rows of the test Angebote page."""
+
+    with open(ANGEBOTE_PAGE, "r", encoding="utf-8") as page:
+        document = lxml.html.fromstring(page.read())
+    return [
+        snapshot.text
+        for snapshot in httpListingPoller.parse_listings(document, f"file://{ANGEBOTE_PAGE}")
+    ]
+
+
+def make_keywords(count: int) -> list:
+    """An exclude list of 'count' plain keywords, mostly random words that don't match."""
+
+    rng = random.Random(count)
+    keywords = list(MATCHING_KEYWORDS)
+    while len(keywords) < count:
+        keywords.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))))
+    return keywords[:count]
+
+
+def loop_filter(keywords: list):
+    """The loop the KeywordFilter replaced: one lowercase substring check per keyword."""
+
+    def find_all(text):
+        return [keyword for keyword in keywords if str(keyword).strip().lower() in text.lower()]
+
+    return find_all
+
+
+def measure(find_all, texts: list, iterations: int) -> float:
+    """Match every text 'iterations' times, returns the microseconds per text."""
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            find_all(text)
+    return (time.perf_counter() - start) / (iterations * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--iterations",
+        dest="iterations",
+        type=int,
+        default=500,
+        help="How many times every listing is matched. [default: 500]",
+    )
+    parser.add_argument(
+        "-k",
+        "--keywords",
+        dest="counts",
+        type=int,
+        nargs="+",
+        default=[10, 40, 80, 200, 1000],
+        help="The numbers of plain keywords to benchmark. [default: 10 40 80 200 1000]",
+    )
+    args = parser.parse_args()
+
+    texts = load_texts()
+    print(
+        f"Matching {len(texts)} listing(s) of ~{sum(map(len, texts)) // len(texts)} characters "
+        f"x {args.iterations} iteration(s), {len(RULE_KEYWORDS)} rule keyword(s) added to the filter\n"
+    )
+    print(f"{'keywords':>8} {'KeywordFilter':>22} {'loop':>19}")
+
+    for count in args.counts:
+        keywords = make_keywords(count)
+        compiled = keyword_filter.KeywordFilter(keywords + RULE_KEYWORDS)
+        loop = loop_filter(keywords)
+
+        # Both find the same plain keywords
+        for text in texts:
+            assert [k for k in compiled.find_all(text) if k in keywords] == loop(text), text
+
+        filter_time = measure(compiled.find_all, texts, args.iterations)
+        loop_time = measure(loop, texts, args.iterations)
+        print(f"{count:>8} {filter_time:>11,.1f} us/listing {loop_time:>8,.1f} us/listing")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from utility import metrics
 import os
 import stat
 import glob
@@ -12,15 +13,17 @@ class ChromeDriverConfigurator:
     Class to create the WebDriver with ChromeOptions
     """
 
-    def __init__(self, headless: bool, test: bool):
+    def __init__(self, headless: bool, test: bool, lazy: bool = False):
         """
         Create a ChromeDriver with default options
+
+        If 'lazy' is set, Chrome is only started on the first call to get_driver()
         """
         self.headless = headless
         self.test = test
         self.chrome_options = Options()
         self.configure_options()
-        self.driver = self.create_driver()
+        self.driver = None if lazy else self.create_driver()
 
     def configure_options(self):
         """
@@ -57,12 +60,19 @@ class ChromeDriverConfigurator:
             service=Service(driver_path),
             options=self.chrome_options,
         )
+        # Count the round trips to Chrome
+        metrics.track_webdriver(self.driver)
         # Wait 5 seconds before doing stuff
         self.driver.implicitly_wait(5)
         return self.driver
 
     def get_driver(self):
+        if self.driver is None:
+            self.create_driver()
         return self.driver
+
+    def is_started(self):
+        return self.driver is not None
     
     def fix_chromedriver_permissions(self):
         """Fix permissions for all chromedriver files in .wdm cache"""
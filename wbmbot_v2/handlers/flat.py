@@ -1,13 +1,24 @@
 import hashlib
 import re
 
+from handlers import listing
+from utility import misc_operations
+
+
+# Patterns used while parsing the lines of a listing, compiled once
+ZIP_CODE_RE = re.compile(r"\d{5}")
+RENT_SUFFIX_RE = re.compile(r"€.*")
+SIZE_RE = re.compile(r"([\d,\.]+)\s*m²")
+ROOMS_RE = re.compile(r"(\d+).*Zimmer")
+NUMBER_RE = re.compile(r"\d+")
+
 
 class Flat:
     """
     A class to represent a flat listing.
 
     This class takes a string representation of a flat listing, splits it by new lines,
-    and assigns various attributes based on the content of each line.
+    and assigns various attributes based on the content of each line in a single pass.
 
     Attributes:
         title (str): The title of the flat listing.
@@ -15,13 +26,30 @@ class Flat:
         street (str): The street address of the flat.
         zip_code (str): The postal code for the flat's location.
         city (str): The city where the flat is located.
-        total_rent (str): The total rent cost for the flat.
-        size (str): The size of the flat.
-        rooms (str): The number of rooms in the flat.
+        total_rent (float): The total rent cost for the flat ("" if unknown).
+        size (float): The size of the flat ("" if unknown).
+        rooms (int): The number of rooms in the flat ("" if unknown).
         wbs (bool): A boolean indicating if the flat has a Wohnberechtigungsschein (WBS).
-        hash (str): A SHA-256 hash of the flat listing details.
+        key (str): The canonical key of the listing (object ID / details page), stable across cosmetic changes.
+        content_hash (str): A SHA-256 hash of the normalized listing details, changes when the details do.
+        hash (str): A SHA-256 hash of the raw listing text (how applications were logged by older versions).
     """
 
+    __slots__ = (
+        "district",
+        "title",
+        "street",
+        "zip_code",
+        "city",
+        "total_rent",
+        "size",
+        "rooms",
+        "wbs",
+        "key",
+        "content_hash",
+        "hash",
+    )
+
     def __init__(self, flat_elem, test: bool):
         """
         Constructs all the necessary attributes for the flat object.
@@ -29,54 +57,106 @@ class Flat:
         Parameters:
             flat_elem (str): The string representation of the flat listing.
         """
-        self.flat_elem = flat_elem
-        self.test = test
-        self.flat_attr = self.flat_elem.split("\n")
-        if not self.test:
-            self.flat_attr = [item for item in self.flat_attr if item.strip()]
-        self.attr_size = len(self.flat_attr)
-        print(self.flat_attr) if self.test else None
-        (
-            self.district,
-            self.title,
-            *_,
-        ) = self.flat_attr
-        self.wbs = "wbs" in self.title.lower() or "wbs" in self.flat_elem.lower()
-        self.hash = hashlib.sha256(self.flat_elem.encode("utf-8")).hexdigest()
-        
-        for i, line in enumerate(self.flat_attr):                
+        flat_attr = flat_elem.split("\n")
+        if not test:
+            flat_attr = [item for item in flat_attr if item.strip()]
+        print(flat_attr) if test else None
+
+        self.district = flat_attr[0] if flat_attr else ""
+        self.title = flat_attr[1] if len(flat_attr) > 1 else ""
+        self.wbs = "wbs" in flat_elem.lower()
+        self.hash = hashlib.sha256(flat_elem.encode("utf-8")).hexdigest()
+        self.content_hash = listing.content_hash(flat_elem)
+        # Without a snapshot, the content is all we have to identify the listing
+        self.key = f"sha256:{self.content_hash}"
+
+        # Values that cannot be found in the text stay "" (unknown)
+        self.street = self.zip_code = self.city = ""
+        self.total_rent = self.size = self.rooms = ""
+
+        last_index = len(flat_attr) - 1
+        for i, line in enumerate(flat_attr):
             # Address: anything before comma, then 5-digit zip
-            if ',' in line and re.search(r'\d{5}', line):
-                parts = line.split(',', 1)
-                self.street = parts[0].strip()
-                zip_match = re.search(r'(\d{5})', parts[1])
+            if "," in line and ZIP_CODE_RE.search(line):
+                street, zip_city = line.split(",", 1)
+                self.street = street.strip()
+                zip_match = ZIP_CODE_RE.search(zip_city)
                 if zip_match:
-                    self.zip_code = zip_match.group(1)
-                    self.city = parts[1].replace(self.zip_code, '').strip()
-            
+                    self.zip_code = zip_match.group()
+                    self.city = zip_city.replace(self.zip_code, "").strip()
+
             # Rent: any number ending with €
-            if '€' in line:
-                rent_text = re.sub(r'€.*', '', line).strip()
+            if "€" in line:
                 # Handle German number format: remove dots, replace comma with dot
-                rent_text = rent_text.replace('.', '')  # Remove all dots
-                rent_text = rent_text.replace(',', '.')  # Decimal separator
+                rent_text = (
+                    RENT_SUFFIX_RE.sub("", line).strip().replace(".", "").replace(",", ".")
+                )
                 try:
                     self.total_rent = float(rent_text)
                 except ValueError:
                     pass
-            
+
             # Size: any number followed by m²
-            size_match = re.search(r'([\d,\.]+)\s*m²', line)
-            if size_match:
-                size_text = size_match.group(1).replace(',', '.')
-                try:
-                    self.size = float(size_text)
-                except ValueError:
-                    pass
-            
+            if "m²" in line:
+                size_match = SIZE_RE.search(line)
+                if size_match:
+                    try:
+                        self.size = float(size_match.group(1).replace(",", "."))
+                    except ValueError:
+                        pass
+
             # Rooms: digit followed by "Zimmer" (same or next line)
-            if re.match(r'^\d+$', line):
-                if (i + 1 < len(self.flat_attr) and self.flat_attr[i + 1] == "Zimmer") or "Zimmer" in line:
+            if line.isdecimal() and line.isascii():
+                if i < last_index and flat_attr[i + 1] == "Zimmer":
                     self.rooms = int(line)
-            elif re.search(r'(\d+).*Zimmer', line):
-                self.rooms = int(re.search(r'(\d+)', line).group(1))
\ No newline at end of file
+            elif "Zimmer" in line and ROOMS_RE.search(line):
+                self.rooms = int(NUMBER_RE.search(line).group())
+
+    def __str__(self):
+        output = ""
+        output += f"Title: {self.title}\n"
+        output += f"District: {self.district}\n"
+        output += f"Street: {self.street}\n"
+        output += f"ZIP Code: {self.zip_code}\n"
+        output += f"City: {self.city}\n"
+        output += f"Total Rent: {self.total_rent}\n"
+        output += f"Size: {self.size}\n"
+        output += f"Rooms: {self.rooms}\n"
+        output += f"WBS: {'Yes' if self.wbs else 'No'}\n"
+        return output
+
+    @classmethod
+    def from_snapshot(cls, snapshot, test: bool):
+        """
+        Constructs a flat from a listing snapshot.
+
+        The snapshot's text is parsed as usual, its structured fields (if any) take
+        precedence over what was parsed from the text.
+
+        Parameters:
+            snapshot (ListingSnapshot): The snapshot of the flat listing.
+        """
+        flat_obj = cls(snapshot.text, test)
+        flat_obj.key = snapshot.key
+
+        if snapshot.title:
+            flat_obj.title = snapshot.title
+        if snapshot.district:
+            flat_obj.district = snapshot.district
+
+        # Address: street, then zip code and city on the next line
+        street, _, zip_city = snapshot.address.partition("\n")
+        zip_match = ZIP_CODE_RE.search(zip_city)
+        if zip_match:
+            flat_obj.street = street.strip().rstrip(",")
+            flat_obj.zip_code = zip_match.group()
+            flat_obj.city = zip_city.replace(flat_obj.zip_code, "").strip()
+
+        if "€" in snapshot.rent:
+            flat_obj.total_rent = misc_operations.convert_rent(snapshot.rent)
+        if "m²" in snapshot.size:
+            flat_obj.size = misc_operations.convert_size(snapshot.size)
+        if snapshot.rooms.strip().isdigit():
+            flat_obj.rooms = misc_operations.get_zimmer_count(snapshot.rooms)
+
+        return flat_obj
@@ -0,0 +1,69 @@
+import hashlib
+import re
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+# Anything that is not a letter or a digit, dropped before hashing a listing's content
+NON_ALPHANUMERIC_RE = re.compile(r"[\W_]+")
+
+
+def content_hash(text: str) -> str:
+    """
+    SHA-256 of a listing's text, normalized so that cosmetic changes don't change it.
+
+    Case, whitespace, punctuation and number formatting ('1.234,50 €' vs '1234.50€')
+    are ignored, the words and digits themselves are not.
+    """
+
+    normalized = NON_ALPHANUMERIC_RE.sub("", text.casefold())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def listing_key(listing_id: str, href: str, text: str) -> str:
+    """
+    The canonical key of a listing, stable across checks and cosmetic changes.
+
+    The WBM object ID if the listing has one, else the path of its details page,
+    else the normalized hash of its content.
+    """
+
+    if listing_id.strip():
+        return listing_id.strip()
+    if href:
+        path = urlparse(href).path.rstrip("/")
+        if path:
+            return path
+    return f"sha256:{content_hash(text)}"
+
+
+class ListingSnapshot(NamedTuple):
+    """
+    An immutable snapshot of a single row on the 'Angebote' page.
+
+    Attributes:
+        text (str): The visible text of the listing row, one block per line.
+        href (str): The absolute link of the row's 'Ansehen' (details) button.
+        listing_id (str): The WBM object ID of the listing (the row's 'data-id').
+        title (str): The listing's title, as displayed.
+        district (str): The listing's district, as displayed.
+        address (str): The listing's address, as displayed (street and zip/city on separate lines).
+        rent (str): The listing's total rent, as displayed (e.g. '690,39 €').
+        size (str): The listing's size, as displayed (e.g. '70,57 m²').
+        rooms (str): The listing's number of rooms, as displayed.
+    """
+
+    text: str
+    href: str
+    listing_id: str
+    title: str = ""
+    district: str = ""
+    address: str = ""
+    rent: str = ""
+    size: str = ""
+    rooms: str = ""
+
+    @property
+    def key(self) -> str:
+        """The canonical key of the listing, see listing_key."""
+
+        return listing_key(self.listing_id, self.href, self.text)
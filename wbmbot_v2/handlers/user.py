@@ -1,5 +1,7 @@
 import json
 
+from utility import keyword_filter
+
 
 class User:
     """
@@ -20,6 +22,7 @@ class User:
         wbs_date (str): The date associated with the user's WBS, formatted without slashes.
         wbs_rooms (str): The number of rooms associated with the user's WBS.
         exclude (list of str): A list of exclude preferences for the user.
+        exclude_filter (KeywordFilter): The exclude preferences, compiled for matching.
         wbs_num (str): A string representing the user's WBS number category.
         flat_rent_below (str): A string representing the user's rent upper limit.
         flat_size_above (str): A string representing the user's flat size bottom limit.
@@ -58,6 +61,8 @@ class User:
             "yes" in self.config.get("wbs_special_housing_needs", "").lower()
         )
         self.exclude = self.config.get("exclude", [])
+        # Compile the exclude keywords once, they are matched against every flat
+        self.exclude_filter = keyword_filter.KeywordFilter(self.exclude)
 
         # Determine the WBS number category based on the provided wbs_num value
         self.wbs_num = self.config.get("wbs_num", "")
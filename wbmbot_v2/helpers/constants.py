@@ -21,7 +21,32 @@ wbm_config_name = f"{os.getcwd()}/configs/wbm_config.json"
 wbm_test_config_name = f"{os.getcwd()}/test-data/wbm_test_config.json"
 
 # Applications Logger that we applied for
-log_file_path = f"{os.getcwd()}/logging/successful_applications.json"
+log_file_path = f"{os.getcwd()}/logging/successful_applications.jsonl"
+# Old JSON log, its entries are migrated to the log above on the first start
+legacy_log_file_path = f"{os.getcwd()}/logging/successful_applications.json"
+# Seconds a flat claimed in the log by a bot that is applying for it is skipped by the other bots sharing the log
+application_claim_timeout = 15 * 60
+
+# When new flats appeared in the past (used to schedule the checks)
+listing_history_path = f"{os.getcwd()}/logging/listing_history.json"
+
+# Listings we have seen, with when they were first seen (entries not listed anymore are dropped after 'seen_listings_max_age_days')
+seen_listings_path = f"{os.getcwd()}/logging/seen_listings.json"
+test_seen_listings_path = f"{os.getcwd()}/logging/seen_listings_test.json"
+seen_listings_max_age_days = 90
+
+# Percentiles of how long each stage of applying takes (and of the time from first seeing a flat to applying),
+# over the last 'latency_window' runs of each stage
+latency_report_path = f"{os.getcwd()}/logging/latency_report.json"
+latency_window = 500
+
+# Prometheus metrics endpoint (--metrics-port), only reachable from this host by default
+metrics_host = "127.0.0.1"
+metrics_poll_duration_buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Profiles of every cycle and application (--profile), the stacks are sampled every 'profile_sample_interval' seconds
+profile_path = f"{os.getcwd()}/logging/profiles/"
+profile_sample_interval = 0.005
 
 # Script Logging
 script_log_path = f"{os.getcwd()}/logging/wbmbot-v2_{today}.log"
@@ -34,6 +59,63 @@ offline_apartment_path = f"{os.getcwd()}/offline_viewings/apartments_expose_pdfs
 wbm_url = "https://www.wbm.de/wohnungen-berlin/angebote/"
 test_wbm_url = f"file://{os.getcwd()}/test-data/angebote.html"
 
+# Query parameter selecting a result page of the Angebote page (HTTP polling falls back to the browser
+# if the server turns out to ignore it)
+wbm_page_param = "tx_openimmo_immobilie[page]"
+
+# HTTP client settings (used when polling without a browser)
+http_timeout = 10
+http_max_workers = 8
+http_headers = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "de-DE,de;q=0.9,en;q=0.8",
+}
+
+# Adaptive check scheduling around the --interval: busy hours are checked up to 'poll_max_speedup' times
+# as often, quiet hours down to 'poll_max_slowdown' times less, never more often than every 'poll_min_interval' seconds
+poll_max_speedup = 4
+poll_max_slowdown = 4
+poll_min_interval = 30
+# Random +/- share added to every wait
+poll_jitter = 0.2
+# Checks per day, 0 means as many as the fixed --interval would make
+poll_budget_per_day = 0
+
+# While offline, the connection is probed after this many seconds, doubling up to the maximum
+connectivity_probe_delay = 10
+connectivity_max_probe_delay = 300
+
+# Expose PDFs are downloaded in the background, in chunks of this many bytes
+pdf_download_workers = 2
+download_chunk_size = 256 * 1024
+
+# Retention of 'offline_viewings', enforced by a background compaction every 'offline_compaction_interval' seconds
+offline_max_age_days = 30
+offline_max_size_mb = 1024
+# Expose PDFs are the record of our applications, keep them regardless of age and size
+offline_keep_applied_pdfs = True
+offline_compaction_interval = 24 * 60 * 60
+offline_compaction_workers = 2
+
+# Notifications are sent in the background, at most this many wait in the queue
+notification_queue_size = 100
+# Seconds to wait for queued notifications when the bot exits
+notification_drain_timeout = 60
+
+# The SMTP connection of e-mail notifications is kept open between e-mails:
+# a NOOP is sent every 'smtp_keepalive_interval' seconds, and it is closed after 'smtp_max_idle' idle seconds
+smtp_keepalive_interval = 60
+smtp_max_idle = 600
+
+# Discord notifications queued within this many seconds are sent as one message
+discord_batch_window = 2
+# How often a Discord message is sent before giving up when rate limited
+discord_max_attempts = 5
+# Total size of the files attached to one Discord message, below Discord's upload limit (10 MB without
+# server boosts) to leave room for the embeds
+discord_max_upload_bytes = 8 * 1024 * 1024
+
 # Intro Banner
 
 intro_banner = r"""
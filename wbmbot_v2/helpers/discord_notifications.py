@@ -1,29 +1,254 @@
+import json
+import queue
+import threading
 import time
 from discord_webhook import DiscordWebhook, DiscordEmbed
 from helpers import constants
 from logger import wbm_logger
+import atexit
 import os
 
 __appname__ = os.path.splitext(os.path.basename(__file__))[0]
 color_me = wbm_logger.ColoredLogger(__appname__)
 LOG = color_me.create_logger()
 
+# Discord accepts up to 10 embeds and 10 files per webhook message
+MAX_EMBEDS = 10
+MAX_FILES = 10
+
+# Open Discord senders by webhook URL
+discord_senders = {}
+discord_senders_lock = threading.Lock()
+
+
+def files_count(batch: list) -> int:
+    """The number of files attached to the (embed, files) events of a batch."""
+
+    return sum(len(files) for _, files in batch)
+
+
+def files_size(batch: list) -> int:
+    """The total size in bytes of the files attached to the (embed, files) events of a batch."""
+
+    return sum(len(content) for _, files in batch for _, content in files)
+
+
+class DiscordSender:
+    """
+    Sends the embeds of a Discord webhook in batches, paced by Discord's rate-limit headers.
+
+    Embeds are queued and sent by a background thread, in the order they were queued.
+    Embeds queued within 'discord_batch_window' seconds of each other are combined into
+    one message of up to 10 embeds (and 10 files of at most 'discord_max_upload_bytes'
+    in total). When 'X-RateLimit-Remaining' reaches 0 the next message waits for
+    'X-RateLimit-Reset-After', a '429 Too Many Requests' is retried after the delay
+    Discord asks for. A message Discord finds too large ('413') is sent again one embed
+    at a time.
+    """
+
+    def __init__(self, webhook_url: str):
+        """
+        Create the sender and start its thread
+
+        Parameters:
+            webhook_url (str): Discord webhook URL.
+        """
+        self.webhook_url = webhook_url
+        self.events = queue.Queue()
+        # The event that didn't fit into the previous batch, it starts the next one
+        self.held_back = None
+        # time.monotonic() until which Discord asked us not to send
+        self.resume_at = 0.0
+        self.worker = threading.Thread(target=self.run, name="discord", daemon=True)
+        self.worker.start()
+
+    def enqueue(self, embed: DiscordEmbed, files: list = None):
+        """
+        Queue an embed, with the files (list of (filename, bytes)) to attach to its message.
+        """
+
+        self.events.put((embed, files or []))
+
+    def next_batch(self):
+        """
+        Wait for the next embeds to send, combining those that arrive close together.
+
+        Returns:
+            list | None: The (embed, files) events of the batch, or None once the sender is closed.
+        """
+
+        event = self.held_back if self.held_back is not None else self.events.get()
+        self.held_back = None
+        if event is None:
+            return None
+        batch = [event]
+        deadline = time.monotonic() + constants.discord_batch_window
+        while len(batch) < MAX_EMBEDS:
+            try:
+                event = self.events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if event is None:
+                # Send what we have, then stop
+                self.events.put(None)
+                break
+            if (
+                files_count(batch + [event]) > MAX_FILES
+                or files_size(batch + [event]) > constants.discord_max_upload_bytes
+            ):
+                self.held_back = event
+                break
+            batch.append(event)
+        return batch
+
+    def run(self):
+        """
+        Send the queued embeds in batches until the sender is closed.
+        """
+
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            try:
+                self.send(batch)
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to send Discord notification: {str(e)} ❌"))
+
+    def build_webhook(self, batch: list) -> DiscordWebhook:
+        """
+        Build a single webhook message with all embeds and files of a batch.
+        """
+
+        webhook = DiscordWebhook(url=self.webhook_url, timeout=constants.http_timeout)
+        for embed, files in batch:
+            webhook.add_embed(embed)
+            for filename, content in files:
+                webhook.add_file(file=content, filename=filename)
+        return webhook
+
+    def wait_for_rate_limit(self):
+        """
+        Sleep until Discord accepts requests again.
+        """
+
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_rate_limit(self, response):
+        """
+        Remember when the next request may be sent, from the response's rate-limit headers.
+        """
+
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset_after = float(response.headers.get("X-RateLimit-Reset-After", 1))
+            self.resume_at = time.monotonic() + reset_after
+
+    def send(self, batch: list):
+        """
+        Send the embeds of a batch as one message, one by one if the message is too large.
+        """
+
+        response = self.post(batch)
+        if response.status_code == 413 and len(batch) > 1:
+            LOG.warning(
+                color_me.yellow(f"Discord message too large, sending its {len(batch)} embeds one by one ⚠️")
+            )
+            for event in batch:
+                self.send([event])
+            return
+        if response.status_code == 413 and batch[0][1]:
+            LOG.warning(color_me.yellow("Discord attachment too large, sending the embed without it ⚠️"))
+            self.send([(batch[0][0], [])])
+            return
+
+        if response.status_code == 200 or response.status_code == 204:
+            LOG.info(
+                color_me.green(f"Discord notification sent successfully ({len(batch)} embed(s)) ✅")
+            )
+        else:
+            LOG.error(
+                color_me.red(f"Discord notification failed with status {response.status_code} ❌")
+            )
+
+    def post(self, batch: list):
+        """
+        Post the embeds of a batch as one message, retrying when rate limited.
+
+        Returns:
+            requests.Response: The response to the last attempt.
+        """
+
+        for attempt in range(1, constants.discord_max_attempts + 1):
+            self.wait_for_rate_limit()
+            # Not execute(), it fails on responses without a JSON body (e.g. a '413' that never reached Discord)
+            response = self.build_webhook(batch).api_post_request()
+            self.update_rate_limit(response)
+
+            if response.status_code != 429:
+                break
+            try:
+                retry_after = float(json.loads(response.content)["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                retry_after = float(response.headers.get("Retry-After", 1))
+            LOG.warning(
+                color_me.yellow(
+                    f"Discord rate limit hit, retrying in {retry_after:.2f} seconds ({attempt}/{constants.discord_max_attempts}) ⏳"
+                )
+            )
+            self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+        return response
+
+    def close(self, timeout: float = constants.notification_drain_timeout):
+        """
+        Send the queued embeds and stop the sender's thread.
+        """
+
+        self.events.put(None)
+        self.worker.join(timeout)
+
+
+def get_discord_sender(webhook_url: str) -> DiscordSender:
+    """
+    Return the Discord sender of a webhook URL, creating it if needed.
+    """
+
+    with discord_senders_lock:
+        if webhook_url not in discord_senders:
+            discord_senders[webhook_url] = DiscordSender(webhook_url)
+        return discord_senders[webhook_url]
+
+
+@atexit.register
+def close_discord_senders():
+    """
+    Send the queued Discord notifications when the bot exits.
+    """
+
+    for sender in list(discord_senders.values()):
+        sender.close()
+
 
 def send_discord_notification(
     webhook_url: str, 
     flat_details: set, 
     user_email: str, 
     application_status: str = "success",
-    pdf_path: str = None
+    pdf_path: str = None,
+    pdf_name: str = None
 ):
     """Send Discord notification for apartment application.
 
+    The notification is queued and sent in a batch with the ones queued right after it.
+
     Args:
         webhook_url (str): Discord webhook URL.
         flat_details (set): Set containing flat information strings.
         user_email (str): Email address used for the application.
         application_status (str): Status of the application ('success' or 'failed').
         pdf_path (str): Path to the PDF file (optional).
+        pdf_name (str): File name of the attached PDF (optional, defaults to the file's name).
     """
 
     if not webhook_url:
@@ -35,9 +260,6 @@ def send_discord_notification(
         return
 
     try:
-        # Initialize Discord webhook
-        webhook = DiscordWebhook(url=webhook_url)
-        
         # Create embed based on application status
         if application_status == "success":
             embed = DiscordEmbed(
@@ -77,15 +299,13 @@ def send_discord_notification(
         # Set footer
         embed.set_footer(text=f"WBMBOT v{constants.bot_version}")
 
-        # Add embed to webhook
-        webhook.add_embed(embed)
-        
         # Add PDF file as attachment if provided
+        files = []
         if pdf_path and os.path.exists(pdf_path):
             try:
                 with open(pdf_path, "rb") as f:
-                    webhook.add_file(file=f.read(), filename=os.path.basename(pdf_path))
-                LOG.info(color_me.blue(f"Added PDF attachment: {os.path.basename(pdf_path)}"))
+                    files.append((pdf_name or os.path.basename(pdf_path), f.read()))
+                LOG.info(color_me.cyan(f"Added PDF attachment: {pdf_name or os.path.basename(pdf_path)}"))
             except Exception as e:
                 LOG.warning(color_me.yellow(f"Failed to attach PDF file: {str(e)}"))
                 # Add PDF path as field if file attachment fails
@@ -94,20 +314,8 @@ def send_discord_notification(
             LOG.warning(color_me.yellow(f"PDF file not found: {pdf_path}"))
             embed.add_embed_field(name="📄 PDF Path", value=f"{pdf_path} (file not found)", inline=False)
         
-        # Send webhook with rate limiting
-        response = webhook.execute()
-        
-        if response.status_code == 200 or response.status_code == 204:
-            LOG.info(
-                color_me.green("Discord notification sent successfully ✅")
-            )
-        else:
-            LOG.error(
-                color_me.red(f"Discord notification failed with status {response.status_code} ❌")
-            )
-            
-        # Add rate limiting delay to prevent Discord API blocks
-        time.sleep(1)
+        # Queue the embed, it is sent together with the ones queued right after it
+        get_discord_sender(webhook_url).enqueue(embed, files)
         
     except Exception as e:
         LOG.error(color_me.red(f"Failed to send Discord notification: {str(e)} ❌"))
@@ -116,6 +324,8 @@ def send_discord_notification(
 def send_discord_status_update(webhook_url: str, message: str, status_type: str = "info"):
     """Send a general status update to Discord.
 
+    The update is queued and sent in a batch with the ones queued right after it.
+
     Args:
         webhook_url (str): Discord webhook URL.
         message (str): Status message to send.
@@ -126,8 +336,6 @@ def send_discord_status_update(webhook_url: str, message: str, status_type: str
         return
 
     try:
-        webhook = DiscordWebhook(url=webhook_url)
-        
         # Set color and emoji based on status type
         colors = {
             'info': '0099ff',      # Blue
@@ -152,16 +360,8 @@ def send_discord_status_update(webhook_url: str, message: str, status_type: str
         embed.set_timestamp()
         embed.set_footer(text=f"WBMBOT v{constants.bot_version}")
         
-        webhook.add_embed(embed)
-        response = webhook.execute()
-        
-        if response.status_code not in [200, 204]:
-            LOG.error(
-                color_me.red(f"Discord status update failed with status {response.status_code} ❌")
-            )
-            
-        # Rate limiting
-        time.sleep(1)
+        # Queue the embed, it is sent together with the ones queued right after it
+        get_discord_sender(webhook_url).enqueue(embed)
         
     except Exception as e:
         LOG.error(color_me.red(f"Failed to send Discord status update: {str(e)} ❌"))
\ No newline at end of file
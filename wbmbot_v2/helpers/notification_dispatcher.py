@@ -0,0 +1,97 @@
+import atexit
+import os
+import queue
+import threading
+
+from helpers import constants
+from logger import wbm_logger
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+
+class NotificationDispatcher:
+    """
+    Sends notifications from a background worker thread, so that applying never waits on them.
+
+    Jobs are queued in a bounded queue and run one after another, in the order they
+    were dispatched. When the queue is full, dispatching blocks until there is room
+    again, so a stuck mail server can't pile up jobs without limit.
+    """
+
+    def __init__(self, max_queued: int = constants.notification_queue_size):
+        """
+        Create the dispatcher, its worker thread is started with the first job
+
+        Parameters:
+            max_queued (int): How many jobs may wait in the queue.
+        """
+        self.jobs = queue.Queue(maxsize=max_queued)
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the worker thread if it isn't running.
+        """
+
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(
+                    target=self.run, name="notifications", daemon=True
+                )
+                self.worker.start()
+
+    def run(self):
+        """
+        Run the queued jobs until the stop marker (None) is queued.
+        """
+
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                func, args, kwargs = job
+                func(*args, **kwargs)
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to send notification: {e} ❌"))
+            finally:
+                self.jobs.task_done()
+
+    def dispatch(self, func, *args, **kwargs):
+        """
+        Queue a notification job, 'func(*args, **kwargs)' is run by the worker thread.
+        """
+
+        self.start()
+        self.jobs.put((func, args, kwargs))
+
+    def close(self, timeout: float = constants.notification_drain_timeout):
+        """
+        Send the queued notifications and stop the worker thread.
+
+        Parameters:
+            timeout (float): How long to wait for the queued notifications, in seconds.
+        """
+
+        if self.worker is None or not self.worker.is_alive():
+            return
+        if not self.jobs.empty():
+            LOG.info(color_me.cyan(f"Sending {self.jobs.qsize()} queued notification(s) 📨"))
+        self.jobs.put(None)
+        self.worker.join(timeout)
+
+
+# Shared by the whole bot, queued notifications are still sent when the bot exits
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.close)
+
+
+def dispatch(func, *args, **kwargs):
+    """
+    Send a notification in the background, see NotificationDispatcher.dispatch.
+    """
+
+    dispatcher.dispatch(func, *args, **kwargs)
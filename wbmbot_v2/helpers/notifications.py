@@ -1,4 +1,9 @@
+import atexit
+import io
 import os
+import smtplib
+import threading
+import time
 
 import yagmail
 from helpers import constants
@@ -8,9 +13,158 @@ __appname__ = os.path.splitext(os.path.basename(__file__))[0]
 color_me = wbm_logger.ColoredLogger(__appname__)
 LOG = color_me.create_logger()
 
+# Open SMTP sessions by sender address
+smtp_sessions = {}
+smtp_sessions_lock = threading.Lock()
+
+
+class SMTPSession:
+    """
+    A long-lived, authenticated SMTP connection that is reused for all e-mails of a sender.
+
+    The connection is opened with the first e-mail and kept open afterwards. While it
+    is open, a keepalive thread sends a NOOP every 'smtp_keepalive_interval' seconds
+    and closes it once it was idle for 'smtp_max_idle' seconds. A connection that
+    was dropped by the server is re-opened and the e-mail is sent again.
+    """
+
+    def __init__(self, send_from: str):
+        """
+        Create the session, without connecting yet
+
+        Parameters:
+            send_from (str): The sender's (outlook.com) e-mail address.
+        """
+        self.yag = yagmail.SMTP(
+            send_from,
+            constants.email_password,
+            smtp_starttls=True,
+            smtp_ssl=False,
+            smtp_skip_login=False,
+            host="smtp-mail.outlook.com",
+            port=587,
+        )
+        self.connected = False
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+        self.keepalive_thread = None
+
+    def connect(self):
+        """
+        Open and authenticate the connection (TCP + STARTTLS + login).
+        """
+
+        self.yag.login()
+        self.connected = True
+        LOG.info(color_me.cyan(f"Connected to the SMTP server as '{self.yag.user}' 🔌"))
+
+        if self.keepalive_thread is None or not self.keepalive_thread.is_alive():
+            self.keepalive_thread = threading.Thread(
+                target=self.keepalive, name="smtp-keepalive", daemon=True
+            )
+            self.keepalive_thread.start()
+
+    def disconnect(self):
+        """
+        Close the connection, it is re-opened with the next e-mail.
+        """
+
+        if self.connected:
+            self.yag.close()
+            self.connected = False
+
+    def is_alive(self) -> bool:
+        """
+        Check with a NOOP whether the server still accepts commands on the connection.
+        """
+
+        try:
+            return self.yag.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def keepalive(self):
+        """
+        Keep the connection open while it is in use, close it once it was idle too long.
+        """
+
+        while True:
+            time.sleep(constants.smtp_keepalive_interval)
+            with self.lock:
+                if not self.connected:
+                    return
+                if time.monotonic() - self.last_used >= constants.smtp_max_idle:
+                    LOG.info(color_me.cyan("Closing the idle SMTP connection 💤"))
+                    self.disconnect()
+                    return
+                if not self.is_alive():
+                    # Dropped by the server, the next e-mail reconnects
+                    self.disconnect()
+                    return
+
+    def send(
+        self, send_to: str, subject: str, body: str, attachment: str = None, attachment_name: str = None
+    ):
+        """
+        Send an e-mail over the session's connection, reconnecting once if it was dropped.
+
+        Raises:
+            smtplib.SMTPException, OSError: If the e-mail could not be sent.
+        """
+
+        if attachment and attachment_name:
+            # yagmail names an attachment after its file, attach the content under the given name instead
+            with open(attachment, "rb") as attachment_file:
+                attachment = io.BytesIO(attachment_file.read())
+            attachment.name = attachment_name
+
+        with self.lock:
+            recipients, message = self.yag.prepare_send(
+                to=send_to, subject=subject, contents=body, attachments=attachment
+            )
+            if not self.connected:
+                self.connect()
+            try:
+                self.yag.smtp.sendmail(self.yag.user, recipients, message)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+                # Dropped (or timed out) by the server since the last e-mail, try once more
+                self.disconnect()
+                self.connect()
+                self.yag.smtp.sendmail(self.yag.user, recipients, message)
+            self.last_used = time.monotonic()
+
+    def close(self):
+        """
+        Close the connection for good.
+        """
+
+        with self.lock:
+            self.disconnect()
+
+
+def get_smtp_session(send_from: str) -> SMTPSession:
+    """
+    Return the SMTP session of a sender, creating it if needed.
+    """
+
+    with smtp_sessions_lock:
+        if send_from not in smtp_sessions:
+            smtp_sessions[send_from] = SMTPSession(send_from)
+        return smtp_sessions[send_from]
+
+
+@atexit.register
+def close_smtp_sessions():
+    """
+    Close all open SMTP sessions when the bot exits.
+    """
+
+    for session in list(smtp_sessions.values()):
+        session.close()
+
 
 def send_email_notification(
-    send_to: str, send_from: str, subject: str, body: str, attachment: str = None
+    send_to: str, send_from: str, subject: str, body: str, attachment: str = None, attachment_name: str = None
 ):
     """Send email notification with optional attachment.
 
@@ -19,6 +173,7 @@ def send_email_notification(
         subject (str): Email subject.
         body (str): Email body.
         attachment (str, optional): Path to the attachment file. Defaults to None.
+        attachment_name (str, optional): File name of the attachment in the e-mail. Defaults to the file's name.
     """
 
     if not constants.email_password:
@@ -38,22 +193,8 @@ def send_email_notification(
         return
 
     try:
-        # Initialize yagmail SMTP connection
-        yag = yagmail.SMTP(
-            send_from,
-            constants.email_password,
-            smtp_starttls=True,
-            smtp_ssl=False,
-            smtp_skip_login=False,
-            host="smtp-mail.outlook.com",
-            port=587,
-        )
-
-        # Send email with attachment if provided
-        if attachment:
-            yag.send(to=send_to, subject=subject, contents=body, attachments=attachment)
-        else:
-            yag.send(to=send_to, subject=subject, contents=body)
+        # Reuse the sender's SMTP connection, it is opened on the first e-mail
+        get_smtp_session(send_from).send(send_to, subject, body, attachment, attachment_name)
 
         LOG.info(
             color_me.green(f"Email notification sent successfully to '{send_to}' ✅")
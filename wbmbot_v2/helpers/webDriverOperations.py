@@ -1,24 +1,60 @@
+import datetime as dt
 import os
 import time
 
-from handlers import flat
-from helpers import constants, notifications, discord_notifications
+from handlers import flat, listing
+from helpers import constants, notifications, discord_notifications, notification_dispatcher
+from httpsWrapper import httpApplicationSubmitter, httpListingPoller, httpPageArchiver
 from httpsWrapper import httpPageDownloader as hpd
 from logger import wbm_logger
 from selenium.common.exceptions import (
     NoSuchElementException,
     StaleElementReferenceException,
     TimeoutException,
+    WebDriverException,
 )
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from utility import io_operations, misc_operations
+from utility import (
+    connectivity,
+    io_operations,
+    latency_tracker,
+    metrics,
+    misc_operations,
+    polling_scheduler,
+    profiler,
+    seen_listings,
+)
 
 __appname__ = os.path.splitext(os.path.basename(__file__))[0]
 color_me = wbm_logger.ColoredLogger(__appname__)
 LOG = color_me.create_logger()
 
+# Reads all flats of the current page in a single WebDriver round trip
+EXTRACT_FLATS_SCRIPT = """
+const field = (row, selector) => {
+    const element = row.querySelector(selector);
+    return element ? element.innerText.trim() : "";
+};
+return Array.from(document.querySelectorAll(".row.openimmo-search-list-item")).map((row) => {
+    const ansehen = Array.from(row.querySelectorAll("a[title='Details']")).find(
+        (link) => link.textContent.includes("Ansehen")
+    );
+    return {
+        text: row.innerText,
+        href: ansehen ? ansehen.href : "",
+        listing_id: row.getAttribute("data-id") || "",
+        title: field(row, ".imageTitle"),
+        district: field(row, ".area"),
+        address: field(row, ".address"),
+        rent: field(row, ".main-property-rent"),
+        size: field(row, ".main-property-size"),
+        rooms: field(row, ".main-property-rooms"),
+    };
+});
+"""
+
 
 def next_page(web_driver, current_page: int):
     """
@@ -70,6 +106,11 @@ def next_page(web_driver, current_page: int):
 def download_expose_as_pdf(web_driver, flat_name: str):
     """
     Gets the EXPOSE link and saves it as a PDF in your localy directory
+
+    The PDF is downloaded in the background.
+
+    Returns:
+        Future: Resolves to the path of the PDF, or None if it could not be downloaded.
     """
 
     # Log the attempt to find the continue button
@@ -83,10 +124,9 @@ def download_expose_as_pdf(web_driver, flat_name: str):
     # Log the href attribute of the found button
     download_link = download_button.get_attribute("href")
 
-    pdf_path = hpd.download_pdf_file(
-        download_link, f"{constants.offline_apartment_path}{constants.now}"
+    return hpd.download_pdf_in_background(
+        download_link, constants.offline_apartment_path
     )
-    return pdf_path
 
 
 def ansehen_btn(web_driver, flat_element, index: int):
@@ -123,6 +163,39 @@ def ansehen_btn(web_driver, flat_element, index: int):
         LOG.error(color_me.red(f"Stale 'Ansehen' button ❌"))
 
 
+def open_flat_link(web_driver, flat_link: str):
+    """
+    Navigates straight to the details page of a flat from its (already known) link.
+
+    This is used when the listing was read over HTTP and there is no 'Ansehen' button element to click.
+    """
+
+    LOG.info(color_me.green(f"Flat link found: {flat_link} 🎯"))
+    web_driver.get(flat_link)
+    return flat_link
+
+
+@profiler.phase_timer("start_browser")
+def start_browser(chrome_driver_instance, start_url: str):
+    """
+    Returns the WebDriver, starting Chrome first if it is not running yet.
+
+    A freshly started browser is pointed to the start page once so that the cookie
+    dialog and the live chat can be dismissed before applying.
+    """
+
+    if chrome_driver_instance.is_started():
+        return chrome_driver_instance.get_driver()
+
+    LOG.info(color_me.cyan("Starting Chrome to apply 🚀"))
+    web_driver = chrome_driver_instance.get_driver()
+    web_driver.get(start_url)
+    accept_cookies(web_driver)
+    close_live_chat_button(web_driver)
+    return web_driver
+
+
+@profiler.phase_timer("fill_form")
 def fill_form(web_driver, user_obj, email: str, test: str):
     """
     Fills out a web form with user information and a specified email address.
@@ -308,6 +381,81 @@ def find_flats(web_driver):
     return web_driver.find_elements(By.CSS_SELECTOR, ".row.openimmo-search-list-item")
 
 
+def snapshot_flats(web_driver):
+    """
+    Read all flats of the current page once into immutable snapshots.
+
+    All rows are extracted with a single script call; if that fails, every row is
+    read element by element instead.
+
+    Returns:
+        list[ListingSnapshot]: One snapshot per flat, in page order.
+    """
+
+    try:
+        rows = web_driver.execute_script(EXTRACT_FLATS_SCRIPT)
+        return [listing.ListingSnapshot(**row) for row in rows or []]
+    except (WebDriverException, TypeError) as e:
+        LOG.warning(color_me.yellow("Bulk flat extraction failed, reading flats one by one 🐢"))
+
+    snapshots = []
+    for flat_element in find_flats(web_driver):
+        try:
+            flat_link = flat_element.find_element(
+                By.XPATH, ".//a[@title='Details'][contains(.,'Ansehen')]"
+            ).get_attribute("href")
+        except NoSuchElementException as e:
+            flat_link = ""
+        snapshots.append(
+            listing.ListingSnapshot(
+                text=flat_element.text,
+                href=flat_link or "",
+                listing_id=flat_element.get_attribute("data-id") or "",
+            )
+        )
+    return snapshots
+
+
+@profiler.phase_timer("collect_flats")
+def collect_flats(web_driver, start_url: str, is_known=None):
+    """
+    Walk all pages of the Angebote page once and snapshot their flats.
+
+    If 'is_known' (tells from a listing's key whether it was seen before) is given,
+    the walk stops at the first page that only holds known listings.
+
+    Returns:
+        tuple: (list[ListingSnapshot]: the flats of all pages in page order, str: the HTML source of the first page)
+    """
+
+    current_page, previous_page = reset_to_start_page(web_driver, start_url, 1, 1)
+
+    accept_cookies(web_driver)
+    close_live_chat_button(web_driver)
+
+    all_flats = snapshot_flats(web_driver)
+    start_page_source = web_driver.page_source
+    page_flats = all_flats
+    while True:
+        if is_known and all(is_known(flat_snapshot.key) for flat_snapshot in page_flats):
+            break
+        previous_page = current_page
+        current_page = next_page(web_driver, current_page)
+        if current_page == previous_page:
+            break
+        time.sleep(1.5)
+
+        page_flats = snapshot_flats(web_driver)
+        # Stop if the page did not actually switch (keys, rows without 'data-id' all have the same empty id)
+        seen_flats = {flat_snapshot.key for flat_snapshot in all_flats}
+        if all(flat_snapshot.key in seen_flats for flat_snapshot in page_flats):
+            break
+        all_flats += page_flats
+
+    return all_flats, start_page_source
+
+
+@profiler.profiled("apply_to_flat")
 def apply_to_flat(
     web_driver,
     flat_element,
@@ -319,156 +467,349 @@ def apply_to_flat(
 ):
     """Apply to the flat using the provided email."""
 
-    # Find and click "Ansehen" button on current flat
-    flat_link = ansehen_btn(web_driver, flat_element, flat_index)
+    with latency_tracker.timed("navigate"):
+        if isinstance(flat_element, listing.ListingSnapshot):
+            # Listing was read over HTTP, go straight to its details page
+            flat_link = open_flat_link(web_driver, flat_element.href)
+        else:
+            # Find and click "Ansehen" button on current flat
+            flat_link = ansehen_btn(web_driver, flat_element, flat_index)
     if "seniorenwohnungen" in flat_link:
         return False
     # Fill out application form on current flat using info stored in user object
-    fill_form(web_driver, user_profile, email, test)
+    with latency_tracker.timed("fill"):
+        fill_form(web_driver, user_profile, email, test)
 
     # Download as PDF
+    pdf_download = None
     if not test:
-        pdf_path = download_expose_as_pdf(web_driver, flat_title)
+        pdf_download = download_expose_as_pdf(web_driver, flat_title)
 
     # Submit form
     if not test:
-        web_driver.find_element(By.XPATH, "//button[@type='submit']").click()
-
-    # Send e-mail notification
-    if not test and user_profile.notifications_email:
-        notifications.send_email_notification(
-            email,
-            user_profile.notifications_email,
-            f"[Applied] {flat_title}",
-            f"Appartment Link: {flat_link}\n\nYour Profile:\n\n{user_profile}",
-            pdf_path,
-        )
+        with latency_tracker.timed("submit"):
+            web_driver.find_element(By.XPATH, "//button[@type='submit']").click()
 
-    # Send Discord notification
-    if not test and user_profile.discord_notifications and constants.discord_webhook_url:
-        # Extract flat details from the flat element for Discord embed
-        flat_details = {
-            f"[Applied] {flat_title}",
-            f"Apartment Link: {flat_link}"
-        }
-        
-        discord_notifications.send_discord_notification(
-            constants.discord_webhook_url,
-            flat_details,
-            email,
-            "success",
-            pdf_path
-        )
+    send_application_notifications(
+        user_profile, email, flat_title, flat_link, pdf_download, test
+    )
 
     return True
 
 
+def apply_to_flat_over_http(
+    application_submitter,
+    flat_element,
+    flat_title: str,
+    user_profile,
+    email: str,
+    test: bool,
+):
+    """
+    Apply to the flat by submitting its form over HTTP, without the browser.
+
+    Returns:
+        bool | str: False if the flat is skipped, otherwise the outcome of the submission
+        (see ApplicationSubmitter.submit). Only if it is NOT_SENT, the browser should be used instead.
+    """
+
+    flat_link = flat_element.href
+    if "seniorenwohnungen" in flat_link:
+        return False
+
+    outcome, pdf_download = application_submitter.submit(
+        flat_link, user_profile, email, test
+    )
+    if outcome == httpApplicationSubmitter.NOT_SENT:
+        LOG.warning(color_me.yellow("Falling back to the browser to apply 🐢"))
+    elif outcome == httpApplicationSubmitter.SUBMITTED:
+        send_application_notifications(
+            user_profile, email, flat_title, flat_link, pdf_download, test
+        )
+    return outcome
+
+
+def send_application_notifications(
+    user_profile, email: str, flat_title: str, flat_link: str, pdf_download, test: bool
+):
+    """
+    Send the e-mail and Discord notifications for a submitted application.
+
+    The notifications are queued and sent in the background, this returns right away.
+    """
+
+    if test:
+        return
+
+    notification_dispatcher.dispatch(
+        notify_application, user_profile, email, flat_title, flat_link, pdf_download
+    )
+
+
+def notify_application(
+    user_profile, email: str, flat_title: str, flat_link: str, pdf_download
+):
+    """
+    Send the e-mail and Discord notifications for a submitted application (notification thread).
+
+    Waits for the expose PDF download, so that the PDF can be attached.
+    """
+
+    pdf_path = pdf_download.result() if pdf_download else None
+    # The PDF is stored under its hash, attach it under the flat's title
+    pdf_name = hpd.pdf_attachment_name(flat_title)
+
+    with latency_tracker.timed("notify"):
+        # Send e-mail notification
+        if user_profile.notifications_email:
+            notifications.send_email_notification(
+                email,
+                user_profile.notifications_email,
+                f"[Applied] {flat_title}",
+                f"Appartment Link: {flat_link}\n\nYour Profile:\n\n{user_profile}",
+                pdf_path,
+                pdf_name,
+            )
+
+        # Send Discord notification
+        if user_profile.discord_notifications and constants.discord_webhook_url:
+            # Extract flat details from the flat element for Discord embed
+            flat_details = {
+                f"[Applied] {flat_title}",
+                f"Apartment Link: {flat_link}"
+            }
+
+            discord_notifications.send_discord_notification(
+                constants.discord_webhook_url,
+                flat_details,
+                email,
+                "success",
+                pdf_path,
+                pdf_name
+            )
+
+
+def record_poll(result: str, started: float):
+    """
+    Count a check of the Angebote page and how long it took in the metrics.
+
+    Parameters:
+        result (str): 'changed', 'unchanged', 'empty' or 'error'.
+        started (float): time.perf_counter() when the check started.
+    """
+
+    metrics.polls.inc(result=result)
+    metrics.poll_duration.observe(time.perf_counter() - started)
+    metrics.last_poll.set(time.time())
+
+
 def process_flats(
-    web_driver,
+    chrome_driver_instance,
     user_profile,
     start_url: str,
-    current_page: int,
-    previous_page: int,
-    page_changed: bool,
     refresh_internal: int,
     test: bool,
+    listing_poller=None,
+    application_submitters=None,
 ):
-    """Process each flat by checking criteria and applying if applicable."""
+    """
+    Process each flat by checking criteria and applying if applicable.
+
+    Every cycle, the flats of all pages are read once into immutable snapshots and
+    all filtering runs on those; the browser is only used to apply.
+
+    If a 'listing_poller' is given, the Angebote page is read over plain HTTP and
+    Chrome is only started once a flat passes all filters. If
+    'application_submitters' are given, the application forms of all emails are
+    submitted over HTTP at the same time and the browser is only used if that fails.
+
+    The wait between cycles adapts 'refresh_internal' to when new flats usually
+    appear, see PollingScheduler.
+
+    How long every stage takes, and how long it takes from first seeing a flat to
+    applying for it, is written to the latency report, see LatencyTracker.
+    With --profile, every cycle is profiled, see ProfilingSession.
+    """
+
+    # Criteria verdict per flat content, it only changes when the flat's details do
+    # (only kept for the flats still listed)
+    flat_verdicts = {}
+    # Archives the Angebote page for offline viewing
+    page_archiver = (
+        None if test else httpPageArchiver.PageArchiver(constants.offline_angebote_path)
+    )
+
+    # Decides when to check next, from when new flats appeared in the past
+    scheduler = polling_scheduler.PollingScheduler(
+        refresh_internal, constants.listing_history_path, adaptive=not test
+    )
+    # Listings seen so far (also in earlier runs), with when they were first seen
+    # (test-runs keep their own index, the test listings must not count as seen on wbm.de)
+    seen = seen_listings.SeenListings(
+        constants.test_seen_listings_path if test else constants.seen_listings_path
+    )
+    # Pagination stops at pages without new listings, unless we know no listings at all yet
+    is_known = None if seen.is_empty() else seen.is_known
 
     while True:
+        # Profile every cycle with --profile
+        profiler.next_cycle()
 
-        if not misc_operations.check_internet_connection():
+        # Known from the outcome of our own requests, only probed while offline
+        if not connectivity.monitor.is_online():
+            retry_in = connectivity.monitor.seconds_until_probe()
             LOG.error(
-                color_me.red("No internet connection found. Retrying in 10 seconds ⚠️")
+                color_me.red(f"No internet connection found. Retrying in {retry_in:.0f} seconds ⚠️")
             )
-            time.sleep(10)
+            time.sleep(retry_in)
             continue
 
-        if not page_changed:
-            current_page, previous_page = reset_to_start_page(
-                web_driver, start_url, current_page, previous_page
-            )
-
-        accept_cookies(web_driver)
-        close_live_chat_button(web_driver)
-
-        # Find all flat offers displayed on current page
+        # Find all flat offers
         LOG.info(color_me.cyan("Looking for flats 👀"))
-        all_flats = find_flats(web_driver)
+        fetch_started = time.perf_counter()
+        if listing_poller:
+            # Without touching the browser
+            try:
+                all_flats = listing_poller.poll(is_known)
+            except httpListingPoller.PaginationNotSupported as e:
+                # Flats beyond the first page would never be seen, walk the pages in the browser
+                LOG.warning(
+                    color_me.yellow(f"Paging over HTTP doesn't work ({e}), using the browser to check for flats ⚠️")
+                )
+                listing_poller = None
+                continue
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to fetch the flats page: {e} ❌"))
+                record_poll("error", fetch_started)
+                scheduler.wait()
+                continue
+
+            # Nothing to do if the listings are the same as on the previous check
+            if all_flats is None:
+                LOG.info(color_me.cyan("No changes since the last check 💤"))
+                record_poll("unchanged", fetch_started)
+                scheduler.wait()
+                continue
+            page_source = listing_poller.page_source()
+        else:
+            try:
+                all_flats, page_source = collect_flats(
+                    chrome_driver_instance.get_driver(), start_url, is_known
+                )
+            except WebDriverException as e:
+                # Chrome could not reach wbm.de (net::ERR_...), anything else is a real crash
+                if "net::ERR_" not in str(e):
+                    raise
+                connectivity.monitor.report_failure(e.msg)
+                record_poll("error", fetch_started)
+                continue
+            connectivity.monitor.report_success()
+        latency_tracker.tracker.record("fetch", time.perf_counter() - fetch_started)
+
         if not all_flats:
             LOG.info(color_me.cyan("Currently no flats available 😔"))
-            time.sleep(int(refresh_internal) * 60)
+            record_poll("empty", fetch_started)
+            scheduler.wait()
             continue
+        record_poll("changed", fetch_started)
+        metrics.flats_seen.inc(len(all_flats))
 
         LOG.info(color_me.green(f"Found {len(all_flats)} flat(s) in total 💡"))
 
-        # Save locally
-        if not test:
-            hpd.save_viewing_offline(
-                start_url,
-                constants.offline_angebote_path,
-                f"{constants.now}/page_{current_page}",
-            )
-
+        # New listings go first, they are the ones we have a chance with
+        detected_at = dt.datetime.now()
+        new_flats = [flat_elem for flat_elem in all_flats if not seen.is_known(flat_elem.key)]
+        known_flats = [flat_elem for flat_elem in all_flats if seen.is_known(flat_elem.key)]
+        all_flats = new_flats + known_flats
+        # Teach the scheduler when new flats appear, on the first run everything is new
+        # (and test-runs would write made-up activity into the live history)
+        if not test and not seen.is_empty():
+            scheduler.record(len(new_flats), detected_at)
+        if new_flats:
+            LOG.info(color_me.cyan(f"{len(new_flats)} new flat(s) since the last check 🆕"))
+            metrics.flats_new.inc(len(new_flats))
+
+        # Save locally, from the page we just fetched
+        if page_archiver:
+            page_archiver.archive_in_background(start_url, page_source)
+
+        applied_any = False
+        listed_hashes = set()
         for i, flat_elem in enumerate(all_flats):
-            time.sleep(2)  # Sleep to mimic human behavior and avoid detection
-
-            # Refresh Flat Elements to avoid staleness
-            all_flats = find_flats(web_driver)
-            flat_elem = all_flats[i]
             # Create flat object
-            flat_obj = flat.Flat(flat_elem.text, test)
+            with latency_tracker.timed("parse"):
+                flat_obj = flat.Flat.from_snapshot(flat_elem, test)
+            listed_hashes.add(flat_obj.content_hash)
 
             if test:
                 LOG.info(color_me.magenta(f"Flat Element: {flat_elem.text}"))
                 LOG.info(color_me.magenta(f"Flat Obj: {flat_obj}"))
 
+            filter_started = time.perf_counter()
+            # Check the flat against the user's criteria once, not once per email
+            if flat_obj.content_hash not in flat_verdicts:
+                flat_verdicts[flat_obj.content_hash] = misc_operations.evaluate_flat_criteria(
+                    flat_elem, flat_obj, user_profile
+                )
+            matches, reason, why = flat_verdicts[flat_obj.content_hash]
+            if not matches:
+                latency_tracker.tracker.record("filter", time.perf_counter() - filter_started)
+                metrics.flats_filtered.inc(reason=reason)
+                LOG.warning(
+                    color_me.yellow(f"Ignoring flat '{flat_obj.title}' because {why} 🙈")
+                )
+                continue
+
+            emails_to_apply = []
             for email in user_profile.emails:
-                # Proceed to check whether we should apply to the flat or skip
-                if not io_operations.check_flat_already_applied(
+                # Proceed to check whether we already applied with this email
+                if io_operations.check_flat_already_applied(
                     constants.log_file_path, email, flat_obj
                 ):
-                    if misc_operations.contains_filter_keywords(
-                        flat_elem, user_profile.exclude
-                    )[0]:
-                        LOG.warning(
-                            color_me.yellow(
-                                f"Ignoring flat '{flat_obj.title}' because it contains exclude keyword(s) --> {misc_operations.contains_filter_keywords(flat_elem, user_profile.exclude)[1]} 🙈"
-                            )
-                        )
-                        continue
-                    if not misc_operations.verify_flat_rent(
-                        (flat_obj.total_rent),
-                        user_profile.flat_rent_below,
-                    ):
-                        LOG.warning(
-                            color_me.yellow(
-                                f"Ignoring flat '{flat_obj.title}' because the rent doesn't match our criteria --> Flat Rent: {(flat_obj.total_rent)} € | User wants it below: {user_profile.flat_rent_below} € 🙈"
-                            )
-                        )
-                        continue
-                    if not misc_operations.verify_flat_size(
-                        (flat_obj.size),
-                        user_profile.flat_size_above,
-                        flat_obj.wbs
-                    ):
-                        LOG.warning(
-                            color_me.yellow(
-                                f"Ignoring flat '{flat_obj.title}' because the size doesn't match our criteria --> Flat Size: {(flat_obj.size)} m² | User wants it above: {user_profile.flat_size_above} m² 🙈"
-                            )
+                    metrics.flats_filtered.inc(reason="already_applied")
+                    LOG.warning(
+                        color_me.yellow(
+                            f"Oops, we already applied for flat: {flat_obj.title} 🚫"
                         )
-                        continue
-                    if not misc_operations.verify_flat_rooms(
-                        (flat_obj.rooms),
-                        user_profile.flat_rooms_above,
-                    ):
-                        LOG.warning(
-                            color_me.yellow(
-                                f"Ignoring flat '{flat_obj.title}' because the rooms don't match our criteria --> Flat Rooms: {(flat_obj.rooms)} | User wants it above: {user_profile.flat_rooms_above} 🙈"
-                            )
+                    )
+                    continue
+                # Claim it, bots sharing the application log must not apply for it at the same time
+                if not io_operations.claim_flat(constants.log_file_path, email, flat_obj):
+                    metrics.flats_filtered.inc(reason="claimed")
+                    LOG.warning(
+                        color_me.yellow(
+                            f"Another bot is applying for flat: {flat_obj.title} with '{email}' 🚫"
                         )
-                        continue
-                    applied = apply_to_flat(
+                    )
+                    continue
+                emails_to_apply.append(email)
+            latency_tracker.tracker.record("filter", time.perf_counter() - filter_started)
+
+            # Submit the applications of all emails at the same time over HTTP
+            http_results = {}
+            if emails_to_apply and application_submitters:
+                http_results = application_submitters.apply_all(
+                    emails_to_apply,
+                    lambda submitter, email: apply_to_flat_over_http(
+                        submitter,
+                        flat_elem,
+                        flat_obj.title,
+                        user_profile,
+                        email,
+                        test,
+                    ),
+                )
+            http_submitted_at = dt.datetime.now()
+
+            for email in emails_to_apply:
+                outcome = http_results.get(email, httpApplicationSubmitter.NOT_SENT)
+                submitted_at = http_submitted_at
+                method = "http"
+                if outcome == httpApplicationSubmitter.NOT_SENT:
+                    method = "browser"
+                    time.sleep(2)  # Sleep to mimic human behavior and avoid detection
+                    web_driver = start_browser(chrome_driver_instance, start_url)
+                    outcome = apply_to_flat(
                         web_driver,
                         flat_elem,
                         i,
@@ -477,45 +818,61 @@ def process_flats(
                         email,
                         test,
                     )
-                    if applied:
-                        LOG.info(
-                            color_me.cyan(
-                                f"Applying to flat: {flat_obj.title} for '{email}' 📩"
-                            )
-                        )
-                        io_operations.write_log_file(
-                            constants.log_file_path, email, flat_obj
+                    submitted_at = dt.datetime.now()
+                    # Give the submitted form time to go through before navigating away
+                    time.sleep(1.5)
+                if outcome == httpApplicationSubmitter.UNKNOWN:
+                    # The form may have reached wbm.de, applying again could send it twice
+                    metrics.flats_filtered.inc(reason="outcome_unknown")
+                    LOG.warning(
+                        color_me.yellow(
+                            f"Not applying to flat: {flat_obj.title} for '{email}' again, the sent form may have been accepted ⚠️"
                         )
-                        LOG.info(color_me.green("Done ✅"))
-                        time.sleep(1.5)
-                        web_driver.get(start_url)
-                        time.sleep(1.5)
-                        # Refresh Flat Elements for each email iteration to avoid staleness
-                        all_flats = find_flats(web_driver)
-                        flat_elem = all_flats[i]
-                    else:
-                        LOG.warning(
-                            color_me.yellow(
-                                f"Ignoring flat: {flat_obj.title} because it is for Seniors only ('seniorenwohnungen') 🙈"
-                            )
+                    )
+                    io_operations.write_log_file(
+                        constants.log_file_path, email, flat_obj, confirmed=False
+                    )
+                elif outcome == httpApplicationSubmitter.REJECTED:
+                    metrics.flats_filtered.inc(reason="rejected")
+                    io_operations.release_flat(constants.log_file_path, email, flat_obj)
+                elif outcome in (True, httpApplicationSubmitter.SUBMITTED):
+                    latency_tracker.tracker.record_time_to_apply(
+                        seen.first_seen_at(flat_elem.key, detected_at), submitted_at
+                    )
+                    applied_any = True
+                    metrics.applications.inc(method=method)
+                    LOG.info(
+                        color_me.cyan(
+                            f"Applying to flat: {flat_obj.title} for '{email}' 📩"
                         )
+                    )
+                    io_operations.write_log_file(
+                        constants.log_file_path, email, flat_obj
+                    )
+                    LOG.info(color_me.green("Done ✅"))
                 else:
+                    metrics.flats_filtered.inc(reason="seniors_only")
+                    io_operations.release_flat(constants.log_file_path, email, flat_obj)
                     LOG.warning(
                         color_me.yellow(
-                            f"Oops, we already applied for flat: {flat_obj.title} 🚫"
+                            f"Ignoring flat: {flat_obj.title} because it is for Seniors only ('seniorenwohnungen') 🙈"
                         )
                     )
-                    continue
 
-            # Try to switch to next page if exists, in the last iteration
-            if i == len(all_flats) - 1:
-                previous_page = current_page
-                current_page = next_page(web_driver, current_page)
-                page_changed = current_page != previous_page
+        # Forget the verdicts of flats that are not listed anymore (or whose details changed)
+        flat_verdicts = {
+            content_hash: verdict
+            for content_hash, verdict in flat_verdicts.items()
+            if content_hash in listed_hashes
+        }
 
-        if not page_changed:
-            time.sleep(int(refresh_internal) * 60)
-        else:
-            time.sleep(1.5)
+        # Only now, a crash above leaves the new flats new for the next run
+        seen.mark((flat_elem.key for flat_elem in all_flats), detected_at)
+        is_known = seen.is_known
+
+        # Percentiles of the stages so far, shown whenever we applied for something
+        latency_tracker.tracker.report(show=applied_any)
+
+        scheduler.wait()
 
         LOG.info(color_me.cyan("Reloading main page 🔄"))
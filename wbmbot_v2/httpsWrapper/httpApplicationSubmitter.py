@@ -0,0 +1,335 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import lxml.html
+import requests
+import urllib3
+from helpers import constants
+from httpsWrapper import httpListingPoller
+from httpsWrapper import httpPageDownloader as hpd
+from logger import wbm_logger
+from utility import connectivity, latency_tracker, profiler
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+POWERMAIL_FORM_XPATH = "//form[contains(concat(' ', normalize-space(@class), ' '), ' powermail_form ')]"
+EXPOSE_BUTTON_XPATH = "//a[contains(concat(' ', normalize-space(@class), ' '), ' openimmo-detail__intro-expose-button ')]"
+# Markers of a form that was sent back because of validation errors
+FORM_ERROR_XPATH = (
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' powermail_field_error ')]"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' powermail_message_error ')]"
+)
+# Markers of the page powermail answers with once it accepted the form
+FORM_CONFIRMATION_XPATH = (
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' powermail_create ')]"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' powermail_message_ok ')]"
+)
+
+# Outcomes of submitting an application form
+# wbm.de confirmed the application
+SUBMITTED = "submitted"
+# The form was never sent, it is safe to apply another way
+NOT_SENT = "not_sent"
+# wbm.de sent the form back with errors
+REJECTED = "rejected"
+# The form was sent but it is unknown whether wbm.de accepted it, applying again may send it twice
+UNKNOWN = "unknown"
+
+# Form fields that are typed in, as (element id, User attribute)
+TEXT_FIELDS = (
+    ("powermail_field_anrede", "sex"),
+    ("powermail_field_name", "last_name"),
+    ("powermail_field_vorname", "first_name"),
+    ("powermail_field_strasse", "street"),
+    ("powermail_field_plz", "zip_code"),
+    ("powermail_field_ort", "city"),
+    ("powermail_field_telefon", "phone"),
+)
+
+
+def never_sent(error: requests.RequestException) -> bool:
+    """
+    Whether a request failed before anything was sent (no connection could be made).
+    """
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def find_by_id(form, element_id: str):
+    """Return the form element with the given ID, or None."""
+
+    elements = form.xpath(f".//*[@id='{element_id}']")
+    return elements[0] if elements else None
+
+
+def set_field(fields: list, name: str, value: str):
+    """Replace all values of a form field with a single value."""
+
+    fields[:] = [(key, val) for key, val in fields if key != name]
+    fields.append((name, value))
+
+
+def option_value(select, text: str):
+    """
+    Value of the first option of a <select> whose label starts with 'text'.
+
+    This mirrors what typing 'text' into the select does in a browser.
+    """
+
+    text = str(text).strip().lower()
+    for option in select.xpath(".//option"):
+        label = option.text_content().strip()
+        if label.lower().startswith(text):
+            return option.get("value", label)
+    return None
+
+
+def type_into(fields: list, element, value: str):
+    """Set a field the way typing 'value' into the element would."""
+
+    if element is None or not element.get("name"):
+        return
+    if element.tag == "select":
+        value = option_value(element, value)
+        if value is None:
+            return
+    elif element.get("type", "").lower() == "date" and len(value) == 8:
+        # 'ddmmyyyy' as typed in the browser, date inputs submit 'yyyy-mm-dd'
+        value = f"{value[4:]}-{value[2:4]}-{value[:2]}"
+    set_field(fields, element.get("name"), value)
+
+
+def check(fields: list, element):
+    """Set a field the way clicking the checkbox/radio element would."""
+
+    if element is None or not element.get("name"):
+        return
+    if element.get("type", "").lower() == "radio":
+        set_field(fields, element.get("name"), element.get("value", "on"))
+    elif (element.get("name"), element.get("value", "on")) not in fields:
+        fields.append((element.get("name"), element.get("value", "on")))
+
+
+class ApplicationSubmitter:
+    """
+    Submits the powermail application form of a flat with plain HTTP requests.
+
+    The details page is loaded once, the form's action, hidden fields and tokens are
+    taken over as they are and the User data is filled in on top before POSTing it.
+    """
+
+    def __init__(self):
+        """
+        Create the submitter with its own keep-alive session
+        """
+        self.session = connectivity.track_session(requests.Session())
+        self.session.headers.update(constants.http_headers)
+
+    def load_page(self, url: str) -> str:
+        """
+        Fetch the HTML source of a page.
+
+        Raises:
+            requests.RequestException: If the page could not be fetched.
+        """
+
+        if url.startswith("file://"):
+            return httpListingPoller.read_local_page(url)
+
+        response = self.session.get(url, timeout=constants.http_timeout)
+        response.raise_for_status()
+        return response.text
+
+    def prepare(self, page_source: str, flat_link: str, user_obj, email: str):
+        """
+        Build the application form data from the details page of a flat.
+
+        Parameters:
+            page_source (str): The HTML source of the flat's details page.
+            flat_link (str): The link of the flat's details page.
+            user_obj (User): The user object containing data to fill the form.
+            email (str): The email address to be used in the form.
+
+        Returns:
+            tuple: (form action URL, list of (name, value) form fields, expose link) or None if the page has no form.
+        """
+
+        document = lxml.html.fromstring(page_source)
+        forms = document.xpath(POWERMAIL_FORM_XPATH)
+        if not forms:
+            return None
+        form = forms[0]
+
+        # Start from what the browser would send untouched: hidden fields, tokens, defaults
+        fields = list(form.form_values())
+
+        if user_obj.wbs:
+            check(fields, find_by_id(form, "powermail_field_wbsvorhanden_1"))
+            type_into(fields, find_by_id(form, "powermail_field_wbsgueltigbis"), user_obj.wbs_date)
+            type_into(fields, find_by_id(form, "powermail_field_wbszimmeranzahl"), user_obj.wbs_rooms)
+            type_into(
+                fields,
+                find_by_id(form, "powermail_field_einkommensgrenzenacheinkommensbescheinigung9"),
+                user_obj.wbs_num,
+            )
+            if user_obj.wbs_special_housing_needs:
+                check(fields, find_by_id(form, "powermail_field_wbsmitbesonderemwohnbedarf_1"))
+        else:
+            check(fields, find_by_id(form, "powermail_field_wbsvorhanden_2"))
+
+        for element_id, attribute in TEXT_FIELDS:
+            type_into(fields, find_by_id(form, element_id), getattr(user_obj, attribute))
+        type_into(fields, find_by_id(form, "powermail_field_e_mail"), email)
+        check(fields, find_by_id(form, "powermail_field_datenschutzhinweis_1"))
+
+        expose_buttons = document.xpath(EXPOSE_BUTTON_XPATH)
+        expose_link = (
+            urljoin(flat_link, expose_buttons[0].get("href", "")) if expose_buttons else None
+        )
+        return urljoin(flat_link, form.get("action", "")), fields, expose_link
+
+    def submit(self, flat_link: str, user_obj, email: str, test: bool):
+        """
+        Apply to a flat by POSTing its application form.
+
+        In a test-run the form data is built but not sent.
+
+        Only SUBMITTED counts as applied, and only NOT_SENT may be retried another way:
+        once the form was sent, a failed or unconfirmed answer is UNKNOWN, since wbm.de
+        may have accepted it anyway.
+
+        Returns:
+            tuple: (str: SUBMITTED, NOT_SENT, REJECTED or UNKNOWN, Future: the expose PDF download or None)
+        """
+
+        try:
+            LOG.info(color_me.cyan(f"Submitting form over HTTP for email address '{email}' ⚡"))
+            with latency_tracker.timed("navigate"):
+                page_source = self.load_page(flat_link)
+            with latency_tracker.timed("fill"):
+                prepared = self.prepare(page_source, flat_link, user_obj, email)
+        except Exception as e:
+            LOG.error(color_me.red(f"Failed to prepare the application form: {e} ❌"))
+            return NOT_SENT, None
+        if prepared is None:
+            LOG.error(color_me.red("Application form not found on the flat page ❌"))
+            return NOT_SENT, None
+        action, fields, expose_link = prepared
+
+        if test:
+            LOG.info(color_me.magenta(f"Form action: {action}"))
+            LOG.info(color_me.magenta(f"Form data: {fields}"))
+            return SUBMITTED, None
+
+        # Download as PDF, in the background
+        pdf_download = None
+        if expose_link:
+            pdf_download = hpd.download_pdf_in_background(
+                expose_link, constants.offline_apartment_path
+            )
+
+        try:
+            # The form is 'multipart/form-data', send every field as a file-less part
+            with latency_tracker.timed("submit"):
+                response = self.session.post(
+                    action,
+                    files=[(name, (None, value)) for name, value in fields],
+                    headers={"Referer": flat_link},
+                    timeout=constants.http_timeout,
+                )
+        except requests.RequestException as e:
+            if never_sent(e):
+                LOG.error(color_me.red(f"Failed to connect to submit the application form: {e} ❌"))
+                return NOT_SENT, pdf_download
+            LOG.error(
+                color_me.red(f"Sent the application form but got no answer, it may have been accepted: {e} ❌")
+            )
+            return UNKNOWN, pdf_download
+
+        try:
+            response.raise_for_status()
+            document = lxml.html.fromstring(response.text)
+        except Exception as e:
+            LOG.error(
+                color_me.red(f"Sent the application form but the answer is unusable, it may have been accepted: {e} ❌")
+            )
+            return UNKNOWN, pdf_download
+
+        if document.xpath(FORM_ERROR_XPATH):
+            LOG.error(color_me.red("The application form was rejected by wbm.de ❌"))
+            return REJECTED, pdf_download
+        if not document.xpath(FORM_CONFIRMATION_XPATH):
+            LOG.error(
+                color_me.red("Sent the application form but wbm.de did not confirm it, it may have been accepted ❌")
+            )
+            return UNKNOWN, pdf_download
+        return SUBMITTED, pdf_download
+
+
+class ApplicationSubmitterPool:
+    """
+    A pool of isolated ApplicationSubmitters, one per email address.
+
+    Every email gets its own session (and cookies), so the applications of all
+    emails for a flat can be submitted at the same time.
+    """
+
+    def __init__(self, emails: list):
+        """
+        Create one submitter per email address
+
+        Parameters:
+            emails (list of str): The email addresses to apply with.
+        """
+        self.submitters = {email: ApplicationSubmitter() for email in emails}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(len(emails), 1), thread_name_prefix="submitter"
+        )
+
+    def submitter(self, email: str) -> ApplicationSubmitter:
+        """Return the submitter of an email address, creating it if needed."""
+
+        if email not in self.submitters:
+            self.submitters[email] = ApplicationSubmitter()
+        return self.submitters[email]
+
+    def close(self):
+        """
+        Stop the submitting threads and close the sessions of all emails.
+        """
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for submitter in self.submitters.values():
+            submitter.session.close()
+
+    @profiler.phase_timer("http_apply")
+    def apply_all(self, emails: list, apply) -> dict:
+        """
+        Run 'apply(submitter, email)' for all emails at the same time.
+
+        Returns:
+            dict: The result of 'apply' per email, UNKNOWN for emails where it raised
+            (the form may have been sent already, it must not be sent again).
+        """
+
+        futures = {
+            email: self.executor.submit(apply, self.submitter(email), email)
+            for email in emails
+        }
+
+        results = {}
+        for email, future in futures.items():
+            try:
+                results[email] = future.result()
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to apply over HTTP for '{email}': {e} ❌"))
+                results[email] = UNKNOWN
+        return results
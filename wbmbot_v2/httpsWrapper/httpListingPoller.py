@@ -0,0 +1,426 @@
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from urllib.parse import urlencode, urljoin, urlparse
+from urllib.request import url2pathname
+
+import lxml.html
+import requests
+from handlers import listing
+from helpers import constants
+from utility import connectivity, profiler
+
+# XPaths of the listing rows and their 'Ansehen' buttons on the Angebote page
+LISTING_ROWS_XPATH = (
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' row ')]"
+    "[contains(concat(' ', normalize-space(@class), ' '), ' openimmo-search-list-item ')]"
+)
+ANSEHEN_XPATH = ".//a[@title='Details'][contains(., 'Ansehen')]"
+PAGINATION_XPATH = (
+    "//ul[contains(concat(' ', normalize-space(@class), ' '), ' pagination ')]"
+)
+
+# Elements that are rendered on their own line(s) by a browser
+BLOCK_TAGS = frozenset(
+    {
+        "address",
+        "article",
+        "aside",
+        "dd",
+        "div",
+        "dl",
+        "dt",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "header",
+        "li",
+        "nav",
+        "ol",
+        "p",
+        "section",
+        "table",
+        "tr",
+        "ul",
+    }
+)
+SKIPPED_TAGS = frozenset({"script", "style", "noscript", "template"})
+
+WHITESPACE_RE = re.compile(r"\s+")
+HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+
+
+def element_text(element) -> str:
+    """
+    Render the visible text of an HTML element the way WebDriver's 'element.text' does.
+
+    Block elements and <br> start a new line, whitespace is collapsed and hidden
+    (display:none) elements are skipped.
+
+    Parameters:
+        element (lxml.html.HtmlElement): The element to render.
+
+    Returns:
+        str: The element's text, one block per line.
+    """
+
+    lines, current = [], []
+
+    def flush():
+        line = WHITESPACE_RE.sub(" ", "".join(current)).strip()
+        if line:
+            lines.append(line)
+        current.clear()
+
+    def walk(node):
+        # Comments and processing instructions have a non-string tag
+        if not isinstance(node.tag, str) or node.tag in SKIPPED_TAGS:
+            return
+        if HIDDEN_STYLE_RE.search(node.get("style", "")):
+            return
+
+        if node.tag == "br":
+            flush()
+            return
+
+        is_block = node.tag in BLOCK_TAGS
+        if is_block:
+            flush()
+        if node.text:
+            current.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                current.append(child.tail)
+        if is_block:
+            flush()
+
+    walk(element)
+    flush()
+    return "\n".join(lines)
+
+
+def read_local_page(url: str) -> str:
+    """
+    Read the HTML source of a 'file://' URL (test-run).
+    """
+
+    with open(url2pathname(urlparse(url).path), "r", encoding="utf-8") as page:
+        return page.read()
+
+
+def listing_fingerprint(document) -> str:
+    """
+    Digest of the search-result section (listing rows and pagination) of an Angebote page.
+
+    The rest of the page (header, scripts, chat widget, ...) is ignored, so only
+    changes to the listings themselves change the fingerprint.
+
+    Parameters:
+        document (lxml.html.HtmlElement): The parsed page.
+
+    Returns:
+        str: The SHA-256 hex digest of the section.
+    """
+
+    digest = hashlib.sha256()
+    for element in document.xpath(f"{LISTING_ROWS_XPATH} | {PAGINATION_XPATH}"):
+        digest.update(lxml.html.tostring(element, encoding="utf-8", with_tail=False))
+    return digest.hexdigest()
+
+
+def page_count(document) -> int:
+    """
+    Number of result pages, read from the 'ul.pagination' page links.
+
+    Parameters:
+        document (lxml.html.HtmlElement): The parsed page.
+
+    Returns:
+        int: The number of result pages (1 if there is no pagination).
+    """
+
+    page_uids = document.xpath(f"{PAGINATION_XPATH}//a[@data-pageuid]/@data-pageuid")
+    return max((int(uid) for uid in page_uids if uid.isdigit()), default=1)
+
+
+def page_url(url: str, page: int) -> str:
+    """
+    URL of the given result page of the Angebote page.
+    """
+
+    if page == 1:
+        return url
+    separator = "&" if urlparse(url).query else "?"
+    return f"{url}{separator}{urlencode({constants.wbm_page_param: page})}"
+
+
+def class_text(row, class_name: str) -> str:
+    """
+    Visible text of the first element with the given class inside a listing row.
+    """
+
+    elements = row.xpath(
+        f".//*[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+    )
+    return element_text(elements[0]) if elements else ""
+
+
+def parse_listings(document, base_url: str) -> list:
+    """
+    Parse all listing rows of an Angebote page.
+
+    Parameters:
+        document (lxml.html.HtmlElement): The parsed page.
+        base_url (str): The URL the page was loaded from, used to resolve relative links.
+
+    Returns:
+        list[ListingSnapshot]: One snapshot per listing row, in page order.
+    """
+
+    flats = []
+    for row in document.xpath(LISTING_ROWS_XPATH):
+        ansehen_button = row.xpath(ANSEHEN_XPATH)
+        href = ansehen_button[0].get("href", "") if ansehen_button else ""
+        flats.append(
+            listing.ListingSnapshot(
+                text=element_text(row),
+                href=urljoin(base_url, href) if href else "",
+                listing_id=row.get("data-id", ""),
+                title=class_text(row, "imageTitle"),
+                district=class_text(row, "area"),
+                address=class_text(row, "address"),
+                rent=class_text(row, "main-property-rent"),
+                size=class_text(row, "main-property-size"),
+                rooms=class_text(row, "main-property-rooms"),
+            )
+        )
+    return flats
+
+
+class PaginationNotSupported(Exception):
+    """
+    The server ignores the page parameter, every result page comes back as the first one.
+    """
+
+
+class ListingPage(NamedTuple):
+    """
+    A parsed result page of the Angebote page.
+
+    Attributes:
+        fingerprint (str): Digest of the page's search-result section.
+        page_count (int): Number of result pages announced by the page's pagination.
+        flats (list[ListingSnapshot]): The listing rows of the page, in page order.
+        html (str): The HTML source of the page.
+    """
+
+    fingerprint: str
+    page_count: int
+    flats: list
+    html: str = ""
+
+
+class ListingPoller:
+    """
+    Polls the WBM Angebote page over plain HTTP, without starting a browser.
+
+    A single keep-alive session is reused for every poll and all result pages are
+    fetched in parallel. Conditional requests (ETag / Last-Modified) and a
+    fingerprint of the search-result section are used to tell whether the listings
+    changed since the previous poll.
+    """
+
+    def __init__(self, url: str):
+        """
+        Create the poller for the given Angebote URL
+
+        Parameters:
+            url (str): The Angebote URL, 'file://' URLs are read from disk (test-run).
+        """
+        self.url = url
+        self.session = connectivity.track_session(requests.Session())
+        self.session.headers.update(constants.http_headers)
+        self.executor = ThreadPoolExecutor(
+            max_workers=constants.http_max_workers, thread_name_prefix="poller"
+        )
+        # Cache validators (ETag / Last-Modified) per URL
+        self.validators = {}
+        # Last parsed version of every page, reused when the server answers '304 Not Modified'
+        self.pages = {}
+        # Number of result pages seen on the previous poll
+        self.page_count = 1
+        # Fingerprint of the search-result section seen on the previous poll
+        self.fingerprint = None
+
+    def fetch_page(self, url: str):
+        """
+        Fetch the HTML source of a page.
+
+        Returns:
+            str | None: The HTML source, or None if the server answered '304 Not Modified'.
+
+        Raises:
+            requests.RequestException: If the page could not be fetched.
+        """
+
+        if url.startswith("file://"):
+            return read_local_page(url)
+
+        response = self.session.get(
+            url, headers=self.validators.get(url), timeout=constants.http_timeout
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        validators = {}
+        if response.headers.get("ETag"):
+            validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        self.validators[url] = validators
+        return response.text
+
+    def load_page(self, page: int) -> ListingPage:
+        """
+        Fetch and parse a single result page.
+
+        Raises:
+            requests.RequestException: If the page could not be fetched.
+        """
+
+        url = page_url(self.url, page)
+        html = self.fetch_page(url)
+        if html is None and url in self.pages:
+            return self.pages[url]
+        if html is None:
+            # '304' for a page we never parsed, fetch it again without validators
+            self.validators.pop(url, None)
+            html = self.fetch_page(url)
+
+        if not html.strip():
+            listing_page = ListingPage("", 1, [])
+        else:
+            document = lxml.html.fromstring(html)
+            listing_page = ListingPage(
+                listing_fingerprint(document),
+                page_count(document),
+                parse_listings(document, url),
+                html,
+            )
+        self.pages[url] = listing_page
+        return listing_page
+
+    def load_pages(self, pages) -> list:
+        """
+        Fetch and parse the given result pages in parallel.
+
+        Returns:
+            list[ListingPage]: The parsed pages, in the given order.
+        """
+
+        return list(self.executor.map(self.load_page, pages))
+
+    def page_source(self) -> str:
+        """
+        HTML source of the first result page, as fetched by the last poll.
+        """
+
+        listing_page = self.pages.get(self.url)
+        return listing_page.html if listing_page else ""
+
+    def check_pagination(self, listing_pages: list):
+        """
+        Make sure the other result pages are not just the first page again.
+
+        The page links of the Angebote page are driven by script, if the server ignores
+        'wbm_page_param' it answers every page with the first one. The listings of
+        those pages would then silently never be seen.
+
+        Raises:
+            PaginationNotSupported: If a later page holds the same listings as the first one.
+        """
+
+        first_page = listing_pages[0]
+        first_keys = {flat_snapshot.key for flat_snapshot in first_page.flats}
+        for page, listing_page in enumerate(listing_pages[1:], start=2):
+            page_keys = {flat_snapshot.key for flat_snapshot in listing_page.flats}
+            if listing_page.fingerprint == first_page.fingerprint or (
+                page_keys and page_keys == first_keys
+            ):
+                raise PaginationNotSupported(
+                    f"page {page} holds the same listings as page 1, "
+                    f"'{constants.wbm_page_param}' seems to be ignored"
+                )
+
+    @profiler.phase_timer("http_poll")
+    def close(self):
+        """
+        Stop the fetching threads and close the session.
+        """
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def poll(self, is_known=None):
+        """
+        Fetch all result pages of the Angebote page and return their listing rows.
+
+        The pages known from the previous poll are fetched at the same time as the
+        first one. Pages announced by the first page on top of those are fetched
+        right after, again in parallel.
+
+        If 'is_known' is given, the first page is fetched alone and the other pages are
+        only fetched (in parallel) if it holds a listing we don't know yet.
+
+        Parameters:
+            is_known (callable): Tells from a listing's key whether it was seen before.
+
+        Returns:
+            list[ListingSnapshot] | None: One snapshot per listing row, in page order,
+            or None if the listings did not change since the previous poll.
+
+        Raises:
+            PaginationNotSupported: If the result pages can't be requested over HTTP.
+        """
+
+        # Saved test pages have no other result pages to request
+        known_pages = 1 if self.url.startswith("file://") else self.page_count
+        if is_known:
+            known_pages = 1
+        listing_pages = self.load_pages(range(1, known_pages + 1))
+
+        total_pages = 1 if self.url.startswith("file://") else listing_pages[0].page_count
+        self.page_count = total_pages
+        if is_known and all(is_known(flat_snapshot.key) for flat_snapshot in listing_pages[0].flats):
+            # Only known listings on the first page, the other pages have nothing new either
+            total_pages = 1
+        if total_pages > known_pages:
+            listing_pages += self.load_pages(range(known_pages + 1, total_pages + 1))
+        listing_pages = listing_pages[:total_pages]
+        self.check_pagination(listing_pages)
+
+        fingerprint = hashlib.sha256(
+            "".join(listing_page.fingerprint for listing_page in listing_pages).encode()
+        ).hexdigest()
+        if fingerprint == self.fingerprint:
+            return None
+        self.fingerprint = fingerprint
+
+        # Combine all pages, a listing that moved pages in between is only kept once
+        flats, seen = [], set()
+        for listing_page in listing_pages:
+            for flat_snapshot in listing_page.flats:
+                if flat_snapshot.key not in seen:
+                    seen.add(flat_snapshot.key)
+                    flats.append(flat_snapshot)
+        return flats
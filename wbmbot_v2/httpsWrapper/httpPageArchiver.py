@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import lxml.html
+import requests
+from helpers import constants
+from httpsWrapper import httpListingPoller
+from logger import wbm_logger
+from utility import connectivity, io_operations
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+# Attributes of the page's assets that are stored alongside the page, as (XPath, attribute)
+ASSET_REFERENCES = (
+    ("//link[@href][contains(@rel, 'stylesheet') or contains(@rel, 'icon')]", "href"),
+    ("//script[@src]", "src"),
+    ("//img[@src]", "src"),
+)
+# Directory (inside the archive) of the content-addressed assets
+ASSETS_DIR = "assets"
+# Index of the stored assets by URL (inside the assets directory)
+ASSETS_INDEX = "index.json"
+# File extensions kept for stored assets, others are stored without one
+ASSET_EXTENSIONS = frozenset(
+    {".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico"}
+)
+
+
+def write_atomically(path: str, content: bytes):
+    """
+    Write a file through a temporary file, so that it is never seen half-written.
+    """
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(temp_path, "wb") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+class PageArchiver:
+    """
+    Archives the already fetched HTML of the Angebote page for offline viewing.
+
+    Pages are stored gzip-compressed and named after the SHA-256 of their content,
+    their stylesheets, scripts and images are stored once in a shared
+    content-addressed 'assets' directory and the page is rewritten to use those.
+    A page whose listings didn't change since the last archived one is not written.
+
+    Archiving runs in a background thread and only downloads assets it hasn't stored yet.
+    """
+
+    def __init__(self, archive_dir: str):
+        """
+        Create the archiver for the given directory
+
+        Parameters:
+            archive_dir (str): The directory to store the pages in.
+        """
+        self.archive_dir = archive_dir
+        self.assets_dir = os.path.join(archive_dir, ASSETS_DIR)
+        self.session = connectivity.track_session(requests.Session())
+        self.session.headers.update(constants.http_headers)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archiver")
+        self.asset_executor = ThreadPoolExecutor(
+            max_workers=constants.http_max_workers, thread_name_prefix="archiver-assets"
+        )
+        # Listing fingerprint of the last archived page
+        self.fingerprint = None
+        self.assets = self.load_assets_index()
+
+    def load_assets_index(self) -> dict:
+        """
+        Load the stored assets (URL -> file name), dropping those whose file is gone.
+        """
+
+        try:
+            with open(os.path.join(self.assets_dir, ASSETS_INDEX), "r", encoding="utf-8") as index:
+                assets = json.load(index)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {
+            url: file_name
+            for url, file_name in assets.items()
+            if os.path.isfile(os.path.join(self.assets_dir, file_name))
+        }
+
+    def save_assets_index(self):
+        """
+        Save the stored assets (URL -> file name).
+        """
+
+        write_atomically(
+            os.path.join(self.assets_dir, ASSETS_INDEX),
+            json.dumps(self.assets, indent=4).encode("utf-8"),
+        )
+
+    def store_asset(self, url: str):
+        """
+        Download an asset into the content-addressed store, unless it is stored already.
+
+        Returns:
+            str | None: The asset's file name in the store, or None if it could not be downloaded.
+        """
+
+        # Stored assets that are no longer used by any page are deleted by the compaction
+        if url in self.assets and os.path.isfile(os.path.join(self.assets_dir, self.assets[url])):
+            return self.assets[url]
+
+        try:
+            response = self.session.get(url, timeout=constants.http_timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            LOG.warning(color_me.yellow(f"Failed to download asset '{url}': {e} ⚠️"))
+            return None
+
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        file_name = hashlib.sha256(response.content).hexdigest() + (
+            extension if extension in ASSET_EXTENSIONS else ""
+        )
+        file_path = os.path.join(self.assets_dir, file_name)
+        if not os.path.isfile(file_path):
+            write_atomically(file_path, response.content)
+        return file_name
+
+    def store_assets(self, document, url: str):
+        """
+        Store the assets of a page and point the page's references to the stored files.
+        """
+
+        references = []
+        for xpath, attribute in ASSET_REFERENCES:
+            for element in document.xpath(xpath):
+                asset_url = urljoin(url, element.get(attribute).strip())
+                if urlparse(asset_url).scheme in ("http", "https"):
+                    references.append((element, attribute, asset_url))
+        if not references:
+            return
+
+        asset_urls = list(dict.fromkeys(asset_url for _, _, asset_url in references))
+        file_names = dict(
+            zip(asset_urls, self.asset_executor.map(self.store_asset, asset_urls))
+        )
+
+        new_assets = {
+            asset_url: file_name
+            for asset_url, file_name in file_names.items()
+            if file_name and asset_url not in self.assets
+        }
+        if new_assets:
+            self.assets.update(new_assets)
+            self.save_assets_index()
+
+        for element, attribute, asset_url in references:
+            if file_names[asset_url]:
+                element.set(attribute, f"{ASSETS_DIR}/{file_names[asset_url]}")
+
+    def archive(self, url: str, html: str):
+        """
+        Archive a page, unless its listings are the same as on the last archived page.
+
+        Parameters:
+            url (str): The URL the page was loaded from.
+            html (str): The HTML source of the page.
+
+        Returns:
+            str | None: The path of the archived page, or None if it was not written.
+        """
+
+        document = lxml.html.fromstring(html)
+        fingerprint = httpListingPoller.listing_fingerprint(document)
+        if fingerprint == self.fingerprint:
+            return None
+
+        io_operations.create_directory_if_not_exists(self.assets_dir)
+        # The stored references are relative to the archived page
+        for base in document.xpath("//base"):
+            base.drop_tree()
+        self.store_assets(document, url)
+
+        content = lxml.html.tostring(
+            document, encoding="utf-8", doctype="<!DOCTYPE html>"
+        )
+        page_path = os.path.join(
+            self.archive_dir, f"{hashlib.sha256(content).hexdigest()}.html.gz"
+        )
+        if not os.path.isfile(page_path):
+            write_atomically(page_path, gzip.compress(content))
+        self.fingerprint = fingerprint
+        return page_path
+
+    def archive_in_background(self, url: str, html: str):
+        """
+        Archive a page in the background, see archive.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the path of the archived page, or None.
+        """
+
+        def archive():
+            try:
+                return self.archive(url, html)
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to archive '{url}': {e} ❌"))
+                return None
+
+        return self.executor.submit(archive)
@@ -1,13 +1,20 @@
+import functools
+import hashlib
 import logging
 import os
-import warnings
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from pywebcopy import save_webpage
-from utility import io_operations
+from helpers import constants
+from logger import wbm_logger
+from utility import connectivity, io_operations, latency_tracker
 
-# Suppress PyWebCopy's logging
-logging.getLogger("pywebcopy").setLevel(logging.CRITICAL)
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
 
 # Suppress requests' logging
 logging.getLogger("requests").setLevel(logging.CRITICAL)
@@ -15,54 +22,108 @@ logging.getLogger("requests").setLevel(logging.CRITICAL)
 # Suppress urllib3's logging
 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 
-# Suppress PyWebCopy's warning about browser opening
-warnings.filterwarnings(
-    "ignore", message="Opening in browser is not supported when threading is enabled!"
+# Keep-alive session shared by all expose downloads
+download_session = connectivity.track_session(requests.Session())
+download_session.headers.update(constants.http_headers)
+# Expose downloads run in the background, applying never waits for them
+download_executor = ThreadPoolExecutor(
+    max_workers=constants.pdf_download_workers, thread_name_prefix="pdf"
 )
+# Running expose downloads by URL, the same expose is only downloaded once for all emails
+pdf_downloads = {}
+pdf_downloads_lock = threading.Lock()
 
-
-def save_viewing_offline(url: str, save_path: str, name: str):
-    """
-    Save a WBM viewing (if found) as an offline HTML file
-    """
-
-    # Download the webpage
-    save_webpage(
-        url=url,
-        project_folder=save_path,
-        project_name=name,
-        bypass_robots=True,  # Bypass robots.txt rules
-        debug=False,  # Print debug information
-        open_in_browser=False,  # Open the saved page in a web browser
-        delay=None,  # Set a delay between requests
-        threaded=True,  # Use threading for faster download
-    )
+# Characters that are not kept in the file name of an attachment
+UNSAFE_FILENAME_RE = re.compile(r"[^\w\-]+")
 
 
-def download_pdf_file(url: str, local_dir: str) -> None:
+def download_pdf_file(url: str, local_dir: str):
     """
     Download a PDF file from the given URL to the local directory.
 
+    The file is streamed to disk and named after the SHA-256 of its content, so the
+    same PDF is only stored once, no matter how often it is downloaded.
+
     Args:
         url (str): The URL of the PDF to be downloaded.
         local_dir (str): The local directory path to save the downloaded PDF.
 
     Returns:
-        None
+        str: The path of the PDF, or None if it could not be downloaded.
     """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise exception if response is not OK
 
-        io_operations.create_directory_if_not_exists(local_dir)
-        file_name = url.split("/")[-1]
-        file_path = os.path.join(local_dir, file_name)
+    temp_path = None
+    start = time.perf_counter()
+    try:
+        with download_session.get(
+            url, stream=True, timeout=constants.http_timeout
+        ) as response:
+            response.raise_for_status()  # Raise exception if response is not OK
 
-        with open(file_path, "wb") as pdf_file:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
+            io_operations.create_directory_if_not_exists(local_dir)
+            # Write to a temporary file first, the same expose may be downloaded by several processes at once
+            temp_path = os.path.join(
+                local_dir, f".{os.getpid()}.{threading.get_ident()}.part"
+            )
+            digest = hashlib.sha256()
+            with open(temp_path, "wb") as pdf_file:
+                for chunk in response.iter_content(
+                    chunk_size=constants.download_chunk_size
+                ):
+                    digest.update(chunk)
                     pdf_file.write(chunk)
 
+        file_path = os.path.join(local_dir, f"{digest.hexdigest()}.pdf")
+        if os.path.isfile(file_path):
+            # Stored by an earlier download already
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, file_path)
+        latency_tracker.tracker.record("pdf", time.perf_counter() - start)
         return file_path
-    except requests.exceptions.RequestException as e:
-        None
+    except (requests.exceptions.RequestException, OSError) as e:
+        LOG.error(color_me.red(f"Failed to download PDF '{url}': {e} ❌"))
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+
+def download_pdf_in_background(url: str, local_dir: str):
+    """
+    Download a PDF file in the background, see download_pdf_file.
+
+    A URL that is already being downloaded is not downloaded again. Finished downloads
+    are forgotten, downloading the same PDF later stores nothing new.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the path of the PDF, or None if it could not be downloaded.
+    """
+
+    with pdf_downloads_lock:
+        download = pdf_downloads.get(url)
+        if download is not None:
+            return download
+        download = download_executor.submit(download_pdf_file, url, local_dir)
+        pdf_downloads[url] = download
+    # Outside of the lock, the callback runs right away if the download is done already
+    download.add_done_callback(functools.partial(forget_download, url))
+    return download
+
+
+def forget_download(url: str, download):
+    """
+    Drop a finished download, so that only the running ones are kept.
+    """
+
+    with pdf_downloads_lock:
+        if pdf_downloads.get(url) is download:
+            del pdf_downloads[url]
+
+
+def pdf_attachment_name(flat_title: str) -> str:
+    """
+    A readable file name for attaching a flat's expose, the stored PDF is named by its hash.
+    """
+
+    name = UNSAFE_FILENAME_RE.sub("_", flat_title).strip("_")[:80]
+    return f"Expose_{name}.pdf" if name else "Expose.pdf"
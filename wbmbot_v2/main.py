@@ -5,8 +5,9 @@ import time
 from chromeDriver import chrome_driver_configurator as cdc
 from handlers import user
 from helpers import constants, webDriverOperations, discord_notifications
+from httpsWrapper import httpApplicationSubmitter, httpListingPoller
 from logger import wbm_logger
-from utility import io_operations, misc_operations
+from utility import connectivity, io_operations, metrics, offline_retention, profiler
 
 __appname__ = os.path.splitext(os.path.basename(__file__))[0]
 os.environ["WDM_LOG"] = "0"
@@ -19,7 +20,7 @@ def parse_args():
 
     parser = argparse.ArgumentParser(
         description="A Selenium-based bot that scrapes 'WBM Angebote' page and auto applies on appartments based on user exclusion filters",
-        usage="%(prog)s " "[-i INTERVAL] " "[-H] " "[-t]",
+        usage="%(prog)s " "[-i INTERVAL] " "[-H] " "[-t] " "[-P] " "[-A] " "[-M PORT] " "[--profile]",
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
 
@@ -29,7 +30,7 @@ def parse_args():
         dest="interval",
         default=3,
         required=False,
-        help="Set the time interval in 'minutes' to check for new flats (refresh) on wbm.de. [default: 3 minutes]",
+        help="Set the base time interval in 'minutes' to check for new flats (refresh) on wbm.de. Checks are more frequent at hours when new flats usually appear and less frequent otherwise, with the same number of checks per day. [default: 3 minutes]",
     )
     parser.add_argument(
         "-H",
@@ -49,6 +50,41 @@ def parse_args():
         required=False,
         help="If set, run test-run on the test data. This does not actually connect to wbm.de.",
     )
+    parser.add_argument(
+        "-P",
+        "--http-poll",
+        dest="http_poll",
+        action="store_true",
+        default=False,
+        required=False,
+        help="If set, check for new flats over plain HTTP. Chrome is only started once a flat passes all filters.",
+    )
+    parser.add_argument(
+        "-A",
+        "--http-apply",
+        dest="http_apply",
+        action="store_true",
+        default=False,
+        required=False,
+        help="If set, submit the application forms over plain HTTP, for all e-mails at once. The browser is only used if the form could not be sent.",
+    )
+    parser.add_argument(
+        "-M",
+        "--metrics-port",
+        dest="metrics_port",
+        type=int,
+        default=None,
+        required=False,
+        help="If set, serve Prometheus metrics (checks, flats, applications, WebDriver round trips, queues, Chrome memory) on 'http://127.0.0.1:PORT/metrics'. Use a different port for every bot on the same host.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        default=False,
+        required=False,
+        help="If set, profile every check and every application and write the profiles (pstats and collapsed stacks) to 'logging/profiles'.",
+    )
 
     return parser.parse_args()
 
@@ -74,18 +110,25 @@ def main():
         )
     )
     LOG.info(color_me.cyan("Checking for internet connection 🔎"))
-    while True:
-        if not misc_operations.check_internet_connection():
-            LOG.error(
-                color_me.red("No internet connection found. Retrying in 10 seconds ⚠️")
-            )
-            time.sleep(10)
-        else:
-            LOG.info(color_me.green("Online 🟢"))
-            break
+    while not connectivity.monitor.probe():
+        retry_in = connectivity.monitor.seconds_until_probe()
+        LOG.error(
+            color_me.red(f"No internet connection found. Retrying in {retry_in:.0f} seconds ⚠️")
+        )
+        time.sleep(retry_in)
+    LOG.info(color_me.green("Online 🟢"))
 
-    chrome_driver_instance = cdc.ChromeDriverConfigurator(args.headless, args.test)
-    web_driver = chrome_driver_instance.get_driver()
+    chrome_driver_instance = cdc.ChromeDriverConfigurator(
+        args.headless, args.test, lazy=args.http_poll
+    )
+
+    # Expose the bot's metrics if requested
+    if args.metrics_port:
+        metrics.watch_chrome(chrome_driver_instance)
+        metrics.start_server(args.metrics_port)
+    # Profile the checks and applications if requested
+    if args.profile:
+        profiler.enable(constants.profile_path)
 
     # Create WBM Config
     wbm_config = (
@@ -97,9 +140,26 @@ def main():
     user_profile = user.User(wbm_config)
     LOG.info(color_me.cyan(f"User Profile Loaded:\n{user_profile}"))
     # Create Logger file
-    io_operations.initialize_application_logger(constants.log_file_path)
+    io_operations.initialize_application_logger(
+        constants.log_file_path, constants.legacy_log_file_path
+    )
+    # Keep 'offline_viewings' in check, in the background (started once, restarts keep it)
+    if not args.test:
+        offline_retention.start_compactor(
+            constants.offline_angebote_path, constants.offline_apartment_path
+        )
     # Get URL
     start_url = constants.wbm_url if not args.test else constants.test_wbm_url
+    # Poll the flats page without a browser if requested
+    listing_poller = (
+        httpListingPoller.ListingPoller(start_url) if args.http_poll else None
+    )
+    # Submit application forms without a browser if requested (one session per email)
+    application_submitters = (
+        httpApplicationSubmitter.ApplicationSubmitterPool(user_profile.emails)
+        if args.http_apply
+        else None
+    )
 
     # Send Discord startup notification
     if not args.test and user_profile.discord_notifications and constants.discord_webhook_url:
@@ -107,35 +167,37 @@ def main():
         discord_notifications.send_discord_status_update(
             constants.discord_webhook_url,
             f"🚀 WBMBOT v{constants.bot_version} started successfully!\n"
-            f"Mode: {mode}\n"
+            f"Mode: {mode}{' (HTTP polling)' if args.http_poll else ''}\n"
             f"Interval: {args.interval} minutes\n"
             f"Target: {start_url}",
             "success"
         )
 
     ###### Start the magic ######
-    current_page = 1
-    previous_page = 1
-    page_changed = False
     LOG.info(color_me.cyan(f"Connecting to '{start_url}' 🔗"))
 
     try:
         while True:
             webDriverOperations.process_flats(
-                web_driver,
+                chrome_driver_instance,
                 user_profile,
                 start_url,
-                current_page,
-                previous_page,
-                page_changed,
                 args.interval,
                 args.test,
+                listing_poller,
+                application_submitters,
             )
     except Exception as e:
         LOG.error(
             color_me.red(f"Bot has crashed... Attempting to restart it now! ❤️‍🩹")
         )
         LOG.error(color_me.red(f"Crash reason: {e}"))
+
+        # The restart creates new ones, don't leave the threads of these running
+        if listing_poller:
+            listing_poller.close()
+        if application_submitters:
+            application_submitters.close()
         
         # Send Discord crash notification
         if not args.test and user_profile.discord_notifications and constants.discord_webhook_url:
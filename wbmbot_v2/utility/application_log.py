@@ -0,0 +1,374 @@
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from helpers import constants
+from logger import wbm_logger
+from utility import file_lock
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+# Suffix given to the old JSON log once its entries were moved to the journal
+MIGRATED_SUFFIX = ".migrated"
+# Suffix of the temporary file a compacted log is written to before it replaces the log
+COMPACT_SUFFIX = ".compact"
+
+
+def record_key(record: dict) -> tuple:
+    """
+    The (email, flat key) pair an application record is indexed by.
+
+    Records of older versions have no 'key', they are indexed by the hash of the flat's raw text.
+
+    Raises:
+        KeyError, TypeError: If the record is not an application record.
+    """
+
+    return (record["email"], record.get("key") or record["hash"])
+
+
+def claim_owner() -> str:
+    """
+    Who claims flats in the journal, unique among the bots sharing it.
+    """
+
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def fsync_directory(path: str):
+    """
+    Flush a directory entry to disk, so that a rename in it survives a crash.
+    """
+
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ApplicationLog:
+    """
+    Append-only journal (JSON Lines) of the applications we sent, with an in-memory index.
+
+    Every line of the file is one application, or a claim of a flat. The file is read
+    once when the log is opened, after that checking for an application is a set
+    lookup and logging one is a single appended line.
+
+    The journal is crash-safe and can be shared by several bot processes:
+
+        - every append is fsync'd before the application counts as logged
+        - a line torn by a crash is ignored on reading and cut off before the next append
+        - appends and compaction hold an exclusive lock on '<log_file>.lock'
+        - lines appended by other processes are picked up before every check
+        - compaction writes a new file and atomically renames it over the journal
+        - a bot claims a flat (per email) under the lock before applying for it, the other
+          bots skip it until it is logged, the claim is released or 'application_claim_timeout'
+          seconds passed (a bot that crashed while applying)
+
+    Attributes:
+        log_file (str): The path to the JSONL log file.
+        applied (set): The (email, flat key) pairs we already applied for.
+        claims (dict): (email, flat key) -> (owner, claimed at) of the flats some bot is applying for.
+        offset (int): How far the journal has been read (always at the end of a complete line).
+        inode (int): The inode of the journal that was read, it changes when another process compacts it.
+    """
+
+    def __init__(self, log_file: str, legacy_log_file: str = None):
+        """
+        Opens the log, migrating the entries of the old JSON log once if given
+
+        Parameters:
+            log_file (str): The path to the JSONL log file.
+            legacy_log_file (str): The path to the old JSON log file ({email: {flat hash: entry}}).
+        """
+        self.log_file = log_file
+        self.applied = set()
+        self.claims = {}
+        self.offset = 0
+        self.inode = None
+        self.lock = threading.Lock()
+
+        with self.locked():
+            if self.refresh():
+                self.compact()
+            if legacy_log_file and os.path.isfile(legacy_log_file):
+                self.migrate(legacy_log_file)
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the lock of the journal, for this process' threads and for other processes.
+        """
+
+        with self.lock:
+            with file_lock.locked(self.log_file):
+                yield
+
+    def refresh(self) -> bool:
+        """
+        Add the lines appended to the journal since it was last read to the index.
+
+        The journal is read from the start again if it was replaced by a compaction.
+
+        Returns:
+            bool: True if unreadable or duplicate lines were found (the journal is worth compacting).
+        """
+
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return False
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.applied.clear()
+            self.claims.clear()
+            self.offset = 0
+            self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return False
+
+        untidy = False
+        with open(self.log_file, "rb") as log:
+            log.seek(self.offset)
+            for line in log:
+                if not line.endswith(b"\n"):
+                    # Torn by a crash in the middle of an append, never counted as logged
+                    untidy = True
+                    break
+                self.offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    key = record_key(record)
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, AttributeError):
+                    LOG.warning(color_me.yellow("Skipping unreadable line of the application log ⚠️"))
+                    untidy = True
+                    continue
+                if "claimed_by" in record or "released_by" in record:
+                    # The next compaction drops the claims that are settled by then
+                    untidy = True
+                elif key in self.applied:
+                    untidy = True
+                self.replay(self.applied, self.claims, record, key)
+        return untidy
+
+    @staticmethod
+    def replay(applied: set, claims: dict, record: dict, key: tuple):
+        """
+        Add a line of the journal to an index of applications and claims.
+        """
+
+        if "claimed_by" in record:
+            claims[key] = (record["claimed_by"], record.get("claimed_at", 0))
+        elif "released_by" in record:
+            if claims.get(key, (None,))[0] == record["released_by"]:
+                del claims[key]
+        else:
+            applied.add(key)
+            claims.pop(key, None)
+
+    def is_claimed(self, key: tuple) -> bool:
+        """
+        Whether another bot claimed a flat and may still be applying for it.
+        """
+
+        owner, claimed_at = self.claims.get(key, (claim_owner(), 0))
+        return owner != claim_owner() and time.time() - claimed_at < constants.application_claim_timeout
+
+    def compact(self):
+        """
+        Rewrite the journal without unreadable, torn and duplicate lines and settled claims.
+
+        The new journal is written and fsync'd next to the old one and then renamed
+        over it, so a crash leaves either the old or the new journal, never a mix.
+        Must be called with the lock held.
+        """
+
+        records, seen, claims, claim_records = [], set(), {}, {}
+        with open(self.log_file, "rb") as log:
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                    key = record_key(record)
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, AttributeError):
+                    continue
+                if "claimed_by" in record:
+                    claim_records[key] = record
+                elif "released_by" not in record and key not in seen:
+                    records.append(record)
+                self.replay(seen, claims, record, key)
+        # Keep the claims of bots that may still be applying
+        claims = {
+            key: (owner, claimed_at)
+            for key, (owner, claimed_at) in claims.items()
+            if time.time() - claimed_at < constants.application_claim_timeout
+        }
+        records += [claim_records[key] for key in claims]
+
+        compact_file = f"{self.log_file}{COMPACT_SUFFIX}"
+        with open(compact_file, "w", encoding="utf-8") as log:
+            for record in records:
+                log.write(json.dumps(record, ensure_ascii=False) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(compact_file, self.log_file)
+        fsync_directory(os.path.dirname(os.path.abspath(self.log_file)))
+
+        stat = os.stat(self.log_file)
+        self.applied = seen
+        self.claims = claims
+        self.offset = stat.st_size
+        self.inode = stat.st_ino
+        LOG.info(color_me.cyan(f"Compacted the application log to {len(seen)} application(s) 🧹"))
+
+    def migrate(self, legacy_log_file: str):
+        """
+        Move the entries of the old JSON log into this log.
+
+        The old file is renamed afterwards, so this only happens once. A damaged old
+        log is left in place, so that its entries are not lost.
+        Must be called with the lock held.
+
+        Parameters:
+            legacy_log_file (str): The path to the old JSON log file.
+        """
+
+        with open(legacy_log_file, "r", encoding="utf-8") as json_file:
+            content = json_file.read()
+        try:
+            # The old log was created empty and maybe never written to
+            legacy_log = json.loads(content) if content.strip() else {}
+        except json.JSONDecodeError:
+            LOG.error(
+                color_me.red(f"Failed to parse the old application log '{legacy_log_file}', not migrating it ❌")
+            )
+            return
+
+        records = [
+            {"email": email.strip(), "hash": flat_hash, **entry}
+            for email, flats in legacy_log.items()
+            for flat_hash, entry in flats.items()
+        ]
+        self.write_records(records)
+        os.replace(legacy_log_file, f"{legacy_log_file}{MIGRATED_SUFFIX}")
+        LOG.info(
+            color_me.cyan(f"Migrated {len(records)} application(s) to '{self.log_file}' 📦")
+        )
+
+    def write_records(self, records: list):
+        """
+        Append the records we don't know yet to the journal and the index.
+
+        The records are fsync'd before they are added to the index.
+        Must be called with the lock held.
+        """
+
+        self.refresh()
+        new_records, keys = [], set()
+        for record in records:
+            key = record_key(record)
+            if key not in self.applied and key not in keys:
+                keys.add(key)
+                new_records.append(record)
+        if not new_records:
+            return
+
+        self.write_lines(new_records)
+        self.applied.update(keys)
+        for key in keys:
+            self.claims.pop(key, None)
+
+    def write_lines(self, records: list):
+        """
+        Append records to the journal and fsync them.
+
+        Must be called with the lock held, right after a refresh.
+        """
+
+        with open(self.log_file, "ab") as log:
+            # Cut off a line torn by a crash, nobody else is writing while we hold the lock
+            log.truncate(self.offset)
+            for record in records:
+                log.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            log.flush()
+            os.fsync(log.fileno())
+            self.offset = log.tell()
+            self.inode = os.fstat(log.fileno()).st_ino
+
+    def contains(self, email: str, *flat_keys: str) -> bool:
+        """
+        Check if we (or another bot process) already applied for a flat with an email.
+
+        Parameters:
+            email (str): The email address.
+            flat_keys (str): The keys the flat may have been logged under.
+        """
+
+        keys = [(email.strip(), flat_key) for flat_key in flat_keys]
+        if any(key in self.applied for key in keys):
+            return True
+        with self.lock:
+            self.refresh()
+        return any(key in self.applied for key in keys)
+
+    def append(self, email: str, entry: dict):
+        """
+        Log an application, unless it is already logged.
+
+        Parameters:
+            email (str): The email we applied with.
+            entry (dict): The flat's log entry, with its key under 'key'.
+        """
+
+        with self.locked():
+            self.write_records([{"email": email.strip(), **entry}])
+
+    def claim(self, email: str, *flat_keys: str) -> bool:
+        """
+        Claim a flat for an email before applying for it, so that no other bot applies for it too.
+
+        Parameters:
+            email (str): The email address.
+            flat_keys (str): The keys the flat may have been logged under, it is claimed under the first.
+
+        Returns:
+            bool: False if the flat was already applied for or another bot claimed it.
+        """
+
+        keys = [(email.strip(), flat_key) for flat_key in flat_keys]
+        owner = claim_owner()
+        with self.locked():
+            self.refresh()
+            if any(key in self.applied for key in keys) or self.is_claimed(keys[0]):
+                return False
+            claimed_at = time.time()
+            self.write_lines(
+                [{"email": email.strip(), "key": flat_keys[0], "claimed_by": owner, "claimed_at": claimed_at}]
+            )
+            self.claims[keys[0]] = (owner, claimed_at)
+        return True
+
+    def release(self, email: str, flat_key: str):
+        """
+        Release our claim of a flat we did not apply for, so that other bots may try.
+        """
+
+        key = (email.strip(), flat_key)
+        owner = claim_owner()
+        with self.locked():
+            self.refresh()
+            if self.claims.get(key, (None,))[0] != owner:
+                return
+            self.write_lines([{"email": email.strip(), "key": flat_key, "released_by": owner}])
+            del self.claims[key]
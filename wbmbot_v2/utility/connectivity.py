@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from helpers import constants
+from logger import wbm_logger
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+
+class ConnectivityMonitor:
+    """
+    Tells whether we are online from the outcome of the requests we send to wbm.de anyway.
+
+    Every answered request (whatever its status code) counts as online, every request
+    that could not connect or timed out counts as offline. Only while offline, a
+    probe request is sent, at most every 'connectivity_probe_delay' seconds, doubling
+    up to 'connectivity_max_probe_delay' seconds after every failed probe.
+    """
+
+    def __init__(self, probe_url: str = constants.wbm_url):
+        """
+        Create the monitor, we are assumed to be online until a request fails
+
+        Parameters:
+            probe_url (str): The URL requested to probe the connection while offline.
+        """
+        self.probe_url = probe_url
+        self.online = True
+        self.failures = 0
+        # time.monotonic() of the next probe while offline
+        self.next_probe_at = 0.0
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers.update(constants.http_headers)
+
+    def report_success(self):
+        """
+        A request was answered, we are online.
+        """
+
+        with self.lock:
+            if not self.online:
+                LOG.info(color_me.green("Online again 🟢"))
+            self.online = True
+            self.failures = 0
+
+    def report_failure(self, error=None):
+        """
+        A request could not connect or timed out, we are offline until a probe succeeds.
+        """
+
+        with self.lock:
+            if self.online:
+                LOG.warning(color_me.yellow(f"Request failed, going offline: {error} 🔴"))
+            self.online = False
+            self.failures += 1
+            delay = min(
+                constants.connectivity_probe_delay * 2 ** (self.failures - 1),
+                constants.connectivity_max_probe_delay,
+            )
+            self.next_probe_at = time.monotonic() + delay
+
+    def seconds_until_probe(self) -> float:
+        """
+        Seconds until the next probe is due (0 while online).
+        """
+
+        with self.lock:
+            if self.online:
+                return 0.0
+            return max(self.next_probe_at - time.monotonic(), 0.0)
+
+    def probe(self) -> bool:
+        """
+        Send a probe request and record its outcome.
+
+        Returns:
+            bool: True if the probe was answered.
+        """
+
+        try:
+            self.session.head(
+                self.probe_url, timeout=constants.http_timeout, allow_redirects=False
+            )
+        except requests.RequestException as e:
+            self.report_failure(e)
+            return False
+        self.report_success()
+        return True
+
+    def is_online(self) -> bool:
+        """
+        Whether we are online. While offline, a probe is sent once it is due.
+        """
+
+        with self.lock:
+            if self.online:
+                return True
+            if time.monotonic() < self.next_probe_at:
+                return False
+        return self.probe()
+
+
+class TrackingAdapter(HTTPAdapter):
+    """
+    A requests adapter that reports the outcome of every request to the connectivity monitor.
+    """
+
+    def send(self, request, **kwargs):
+        try:
+            response = super().send(request, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            monitor.report_failure(e)
+            raise
+        monitor.report_success()
+        return response
+
+
+# Shared by the whole bot
+monitor = ConnectivityMonitor()
+
+
+def track_session(session: requests.Session) -> requests.Session:
+    """
+    Report the outcome of all requests of a session to the connectivity monitor.
+    """
+
+    session.mount("http://", TrackingAdapter())
+    session.mount("https://", TrackingAdapter())
+    return session
@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows), only threads of this process are synchronized
+    fcntl = None
+
+# Suffix of the lock file shared by all processes using the same file
+LOCK_SUFFIX = ".lock"
+
+# One lock per file for the threads of this process (flock is held per open file, not per thread)
+thread_locks = {}
+thread_locks_lock = threading.Lock()
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Hold the lock of a file shared by several bot processes, for this process' threads and for other processes.
+
+    The lock is an exclusive flock on '<path>.lock', the file itself is never locked
+    so that it can be replaced by a rename while the lock is held. It is not reentrant.
+
+    Parameters:
+        path (str): The path of the shared file.
+    """
+
+    with thread_locks_lock:
+        thread_lock = thread_locks.setdefault(path, threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}{LOCK_SUFFIX}", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -4,12 +4,15 @@ import re
 
 from helpers import constants
 from logger import wbm_logger
-from utility import interaction, misc_operations
+from utility import application_log, interaction, misc_operations, profiler
 
 __appname__ = os.path.splitext(os.path.basename(__file__))[0]
 color_me = wbm_logger.ColoredLogger(__appname__)
 LOG = color_me.create_logger()
 
+# Opened application logs by path, they are read from disk only once
+application_logs = {}
+
 
 # Function to check for the existence of the config file and load it
 def load_wbm_config(file_name: str):
@@ -45,77 +48,59 @@ def load_wbm_config(file_name: str):
                 LOG.error(color_me.red(f"Failed to parse WBM config file ❌"))
 
 
-def initialize_application_logger(log_file: str):
+def initialize_application_logger(log_file: str, legacy_log_file: str = None):
     """
-    Checks if a file exists at the specified path and creates it if it doesn't.
+    Opens the application log, creating it if it doesn't exist.
+
+    The entries of the old JSON log are migrated on the first start.
 
     Parameters:
-        file_path (str): The path to the file.
+        log_file (str): The path to the JSONL log file.
+        legacy_log_file (str): The path to the old JSON log file.
+
+    Returns:
+        ApplicationLog: The opened application log.
     """
 
-    # Check if the log file exists
-    if not os.path.isfile(log_file):
-        # If the log file does not exist, create it by opening in append mode and immediately closing it
-        with open(log_file, "a") as file:
-            pass
+    if log_file not in application_logs:
+        application_logs[log_file] = application_log.ApplicationLog(
+            log_file, legacy_log_file
+        )
+    return application_logs[log_file]
 
 
-def write_log_file(log_file: str, email: str, flat_obj):
+@profiler.phase_timer("application_log")
+def write_log_file(log_file: str, email: str, flat_obj, confirmed: bool = True):
     """
-    Write a nested dictionary log entry to the log file.
+    Append a log entry to the application log.
 
     Parameters:
-        log_file (str): The path to the JSON log file.
+        log_file (str): The path to the JSONL log file.
         email (str): The email associated with the log entry.
         flat_obj (object): An object containing information about the flat.
+        confirmed (bool): False if the application was sent but not confirmed by wbm.de
+            (it is logged anyway, so that it is not sent twice).
 
     Returns:
         None
     """
 
-    # Read existing log entries
-    try:
-        with open(log_file, "r") as json_file:
-            existing_log = json.load(json_file)
-    except FileNotFoundError:
-        existing_log = {}
-    except json.decoder.JSONDecodeError:
-        existing_log = {}
-
-    # Check if email already exists in the log
-    if email in existing_log:
-        # Check if the entry with the same hash exists
-        if flat_obj.hash not in existing_log[email]:
-            existing_log[email][flat_obj.hash] = {
-                "date": constants.today.isoformat(),
-                "title": flat_obj.title,
-                "street": flat_obj.street,
-                "zip_code": flat_obj.zip_code,
-                "rent": (flat_obj.total_rent),
-                "size": (flat_obj.size),
-                "rooms": (flat_obj.rooms),
-                "wbs?": flat_obj.wbs,
-            }
-    else:
-        # If email doesn't exist, add a new entry
-        existing_log[email] = {
-            flat_obj.hash: {
-                "date": constants.today.isoformat(),
-                "title": flat_obj.title,
-                "date": constants.today.isoformat(),
-                "title": flat_obj.title,
-                "street": flat_obj.street,
-                "zip_code": flat_obj.zip_code,
-                "rent": (flat_obj.total_rent),
-                "size": (flat_obj.size),
-                "rooms": (flat_obj.rooms),
-                "wbs?": flat_obj.wbs,
-            }
-        }
-
-    # Write the updated log back to the file
-    with open(log_file, "w") as json_file:
-        json.dump(existing_log, json_file, indent=4, ensure_ascii=False)
+    initialize_application_logger(log_file).append(
+        email,
+        {
+            "key": flat_obj.key,
+            "content_hash": flat_obj.content_hash,
+            "date": constants.today.isoformat(),
+            "title": flat_obj.title,
+            "street": flat_obj.street,
+            "zip_code": flat_obj.zip_code,
+            "rent": (flat_obj.total_rent),
+            "size": (flat_obj.size),
+            "rooms": (flat_obj.rooms),
+            "wbs?": flat_obj.wbs,
+            "confirmed": confirmed,
+        },
+    )
 
 
 def create_directory_if_not_exists(directory_path: str) -> None:
@@ -134,12 +119,13 @@ def create_directory_if_not_exists(directory_path: str) -> None:
         LOG.error(color_me.red(f"Failed to create directory ({directory_path}) ❌"))
 
 
+@profiler.phase_timer("application_log")
 def check_flat_already_applied(log_file: str, email: str, flat_obj):
     """
     Check if an application for the flat has already been sent.
 
     Parameters:
-        log_file (str): The path to the JSON log file.
+        log_file (str): The path to the JSONL log file.
         flat_obj (object): An object containing information about the flat.
         email (str): The email associated with the log entry.
 
@@ -147,17 +133,39 @@ def check_flat_already_applied(log_file: str, email: str, flat_obj):
         bool: True if an application has already been sent, False otherwise.
     """
 
-    try:
-        with open(log_file, "r") as json_file:
-            log = json.load(json_file)
-    except FileNotFoundError:
-        return False
-    except json.decoder.JSONDecodeError:
-        return False
-
-    email = email.strip()
-    if email in log:
-        for flat_hash, flat_data in log[email].items():
-            if flat_hash == flat_obj.hash:
-                return True
-    return False
+    # Applications logged by older versions are keyed by the hash of the raw text
+    return initialize_application_logger(log_file).contains(
+        email, flat_obj.key, flat_obj.hash
+    )
+
+
+@profiler.phase_timer("application_log")
+def claim_flat(log_file: str, email: str, flat_obj):
+    """
+    Claim the flat for an email in the application log, so that no other bot sharing the log applies for it too.
+
+    Parameters:
+        log_file (str): The path to the JSONL log file.
+        email (str): The email we are about to apply with.
+        flat_obj (object): An object containing information about the flat.
+
+    Returns:
+        bool: True if we may apply, False if it was applied for or another bot is applying for it.
+    """
+
+    return initialize_application_logger(log_file).claim(
+        email, flat_obj.key, flat_obj.hash
+    )
+
+
+def release_flat(log_file: str, email: str, flat_obj):
+    """
+    Release the claim of a flat we did not apply for after all.
+
+    Parameters:
+        log_file (str): The path to the JSONL log file.
+        email (str): The email the flat was claimed for.
+        flat_obj (object): An object containing information about the flat.
+    """
+
+    initialize_application_logger(log_file).release(email, flat_obj.key)
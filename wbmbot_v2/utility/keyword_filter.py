@@ -0,0 +1,131 @@
+import re
+
+# Prefix of a keyword that only matches whole words, e.g. "=wbs"
+WORD_PREFIX = "="
+# Wildcard inside a keyword, matches any run of non-whitespace characters, e.g. "1*zimmer"
+WILDCARD = "*"
+# Marks the end of a keyword in the trie
+END = ""
+
+
+def trie_pattern(node: dict) -> str:
+    """
+    Translate a trie of keywords into a regular expression matching the longest keyword at a position.
+
+    The branches of a node start with different characters, so at most one of them
+    matches and the pattern never tries the keywords one after another.
+    """
+
+    branches = [
+        re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char != END
+    ]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # A keyword ending here may be the prefix of a longer one, which is preferred
+    return f"(?:{pattern})?" if END in node else pattern
+
+
+class KeywordFilter:
+    """
+    A class to match a list of exclude keywords against a text.
+
+    The keywords are compiled once, and matched case-insensitively as substrings,
+    unless they use one of these rules:
+
+        "=word"     only matches 'word' as a whole word
+        "wo*rd"     '*' matches any run of non-whitespace characters
+
+    The plain keywords are compiled into a single pattern built from their trie, so
+    matching them costs about the same for a handful of keywords as for hundreds.
+    The few keywords using a rule are matched one by one.
+
+    Attributes:
+        keywords (list of str): The keywords as configured (empty ones are ignored).
+        plain (dict): Lowercase plain keyword -> indices of the keywords spelling it.
+        pattern (re.Pattern): The pattern of all plain keywords, None if there are none.
+        implied (dict): Lowercase plain keyword -> the lowercase plain keywords it contains.
+        rules (list of tuple): (keyword index, re.Pattern) of every keyword using a rule.
+    """
+
+    def __init__(self, keywords):
+        """
+        Compiles the keywords.
+
+        Parameters:
+            keywords (list of str): The exclude keywords of the user.
+        """
+        self.keywords = [str(keyword) for keyword in keywords if str(keyword).strip()]
+
+        self.plain = {}
+        self.rules = []
+        for i, keyword in enumerate(self.keywords):
+            if self.is_rule(keyword):
+                self.rules.append((i, re.compile(self.keyword_pattern(keyword), re.IGNORECASE)))
+            else:
+                self.plain.setdefault(keyword.strip().lower(), []).append(i)
+
+        trie = {}
+        for keyword in self.plain:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[END] = {}
+        self.pattern = re.compile(trie_pattern(trie)) if self.plain else None
+
+        # Only the longest keyword at a position is matched, the ones inside it are found through it
+        self.implied = {
+            keyword: [other for other in self.plain if other != keyword and other in keyword]
+            for keyword in self.plain
+        }
+
+    @staticmethod
+    def is_rule(keyword: str) -> bool:
+        """Whether a keyword uses the whole-word or wildcard rule."""
+
+        keyword = keyword.strip()
+        return keyword.startswith(WORD_PREFIX) or WILDCARD in keyword
+
+    @staticmethod
+    def keyword_pattern(keyword: str) -> str:
+        """Translate a single keyword into its regular expression."""
+
+        keyword = keyword.strip()
+        whole_word = keyword.startswith(WORD_PREFIX) and len(keyword) > 1
+        if whole_word:
+            keyword = keyword[len(WORD_PREFIX) :]
+
+        pattern = r"\S*?".join(re.escape(part) for part in keyword.split(WILDCARD))
+        return rf"\b{pattern}\b" if whole_word else pattern
+
+    def find_all(self, text: str) -> list:
+        """
+        Find all keywords contained in a text.
+
+        Parameters:
+            text (str): The text to search.
+
+        Returns:
+            list of str: The keywords found, in configured order.
+        """
+
+        found = set()
+
+        if self.pattern is not None:
+            lowered = text.lower()
+            matched = set()
+            # Search again right after the start of every match, so overlapping keywords are found too
+            match = self.pattern.search(lowered)
+            while match is not None:
+                matched.add(match.group())
+                match = self.pattern.search(lowered, match.start() + 1)
+            for keyword in matched:
+                found.update(self.plain[keyword])
+                for other in self.implied[keyword]:
+                    found.update(self.plain[other])
+
+        for i, rule in self.rules:
+            if rule.search(text):
+                found.add(i)
+
+        return [self.keywords[i] for i in sorted(found)]
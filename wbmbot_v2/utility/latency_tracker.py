@@ -0,0 +1,136 @@
+import datetime as dt
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from helpers import constants
+from logger import wbm_logger
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+# Stages of getting from a listing to a sent application, in order
+STAGES = ("fetch", "parse", "filter", "navigate", "fill", "pdf", "submit", "notify")
+# From a listing being first seen on the Angebote page to its form being submitted (per email)
+TIME_TO_APPLY = "time_to_apply"
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list, percent: int) -> float:
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LatencyTracker:
+    """
+    Keeps the durations of the last 'latency_window' runs of every stage and reports their percentiles.
+
+    Durations are recorded from any thread (browser, HTTP submitters, PDF downloads,
+    notifications) and are in seconds.
+    """
+
+    def __init__(self, window: int = constants.latency_window):
+        """
+        Create the tracker
+
+        Parameters:
+            window (int): How many of the latest durations are kept per stage.
+        """
+        self.window = window
+        self.durations = {name: deque(maxlen=window) for name in STAGES + (TIME_TO_APPLY,)}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        """
+        Record a duration of a stage (or of the time to apply).
+        """
+
+        with self.lock:
+            self.durations.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def record_time_to_apply(self, first_seen: dt.datetime, submitted: dt.datetime = None):
+        """
+        Record the time from a listing being first seen to an application being submitted for it.
+        """
+
+        submitted = submitted or dt.datetime.now()
+        self.record(TIME_TO_APPLY, (submitted - first_seen).total_seconds())
+
+    def summary(self) -> dict:
+        """
+        The count and percentiles of every stage that has durations.
+
+        Returns:
+            dict: Stage -> {"count": int, "p50": float, "p95": float, "p99": float}
+        """
+
+        with self.lock:
+            durations = {name: sorted(values) for name, values in self.durations.items() if values}
+        return {
+            name: {
+                "count": len(values),
+                **{f"p{percent}": round(percentile(values, percent), 3) for percent in PERCENTILES},
+            }
+            for name, values in durations.items()
+        }
+
+    def report(self, report_file: str = constants.latency_report_path, show: bool = True):
+        """
+        Write the percentiles to the report file and show them in the logs.
+
+        Parameters:
+            report_file (str): The path of the JSON report file.
+            show (bool): Whether to show the percentiles in the logs too.
+        """
+
+        summary = self.summary()
+        if not summary:
+            return
+
+        if show:
+            for name, stats in summary.items():
+                LOG.info(
+                    color_me.cyan(
+                        f"Latency {name:<13} p50 {stats['p50']:>8.2f}s | p95 {stats['p95']:>8.2f}s | "
+                        f"p99 {stats['p99']:>8.2f}s ({stats['count']} run(s)) ⏱️"
+                    )
+                )
+
+        report = {
+            "updated": dt.datetime.now().isoformat(timespec="seconds"),
+            "window": self.window,
+            "latency_seconds": summary,
+        }
+        temp_path = f"{report_file}.part"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as report_json:
+                json.dump(report, report_json, indent=4)
+            os.replace(temp_path, report_file)
+        except OSError as e:
+            LOG.warning(color_me.yellow(f"Failed to write the latency report: {e} ⚠️"))
+
+
+# Shared by the whole bot
+tracker = LatencyTracker()
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Record how long the block takes as a duration of 'stage'.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracker.record(stage, time.perf_counter() - start)
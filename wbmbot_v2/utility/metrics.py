@@ -0,0 +1,410 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from helpers import constants, discord_notifications, notification_dispatcher
+from logger import wbm_logger
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# All metrics, in the order they are exposed
+registry = []
+# The running metrics endpoint, the bot restarting itself keeps it
+server = None
+
+
+def escape_label_value(value) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+    """
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: tuple, labelvalues: tuple) -> str:
+    """
+    Format the labels of a sample, e.g. '{reason="rent"}'.
+    """
+
+    labels = [
+        f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)
+    ]
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    """
+    Format a sample value, whole numbers without a fraction.
+    """
+
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """
+    A named metric with optional labels, registered to be exposed.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+        Create and register the metric
+
+        Parameters:
+            name (str): The metric name, prefixed with 'wbmbot_'.
+            documentation (str): The HELP text.
+            labelnames (tuple of str): The names of the metric's labels.
+        """
+        self.name = f"wbmbot_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def labelvalues(self, labels: dict) -> tuple:
+        """
+        The label values in the order of the label names.
+
+        Raises:
+            ValueError: If the labels don't match the metric's label names.
+        """
+
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> list:
+        """
+        The lines of the metric's samples.
+        """
+
+        return []
+
+    def render(self) -> str:
+        """
+        The metric in the Prometheus text format.
+        """
+
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return "\n".join(lines + self.samples()) + "\n"
+
+
+class Counter(Metric):
+    """
+    A value that only goes up.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {} if labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1, **labels):
+        """Add 'amount' to the counter of the given labels."""
+
+        key = self.labelvalues(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict:
+        """The current values, by label values."""
+
+        with self.lock:
+            return dict(self.values)
+
+    def samples(self) -> list:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, either set directly or read from a function on every scrape.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value: float, **labels):
+        """Set the gauge of the given labels."""
+
+        key = self.labelvalues(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, function, **labels):
+        """
+        Read the gauge of the given labels from 'function()' on every scrape.
+
+        The function may return None if there is no value (the sample is left out then).
+        """
+
+        key = self.labelvalues(labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def samples(self) -> list:
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception as e:
+                LOG.warning(color_me.yellow(f"Failed to read {self.name}: {e} ⚠️"))
+                values[key] = None
+        return [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in sorted(values.items())
+            if value is not None
+        ]
+
+
+class Histogram(Metric):
+    """
+    Counts observed values (e.g. durations) into cumulative buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Count a value into its bucket."""
+
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def samples(self) -> list:
+        with self.lock:
+            counts, total_sum = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {format_value(total_sum)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text format.
+    """
+
+    return "".join(metric.render() for metric in registry)
+
+
+# Checks of the Angebote page
+polls = Counter(
+    "polls_total",
+    "Checks of the Angebote page, by result (changed, unchanged, empty, error).",
+    ("result",),
+)
+poll_duration = Histogram(
+    "poll_duration_seconds",
+    "How long fetching the Angebote page takes.",
+    constants.metrics_poll_duration_buckets,
+)
+last_poll = Gauge(
+    "last_poll_timestamp_seconds",
+    "Unix time of the last finished check, a bot that is stuck stops updating it.",
+)
+
+# What happened to the flats
+flats_seen = Counter("flats_seen_total", "Flats found on the Angebote page, counted on every check.")
+flats_new = Counter("flats_new_total", "Flats that were not seen on any earlier check.")
+flats_filtered = Counter(
+    "flats_filtered_total",
+    "Flats (per check) or applications (per email) skipped, by reason.",
+    ("reason",),
+)
+applications = Counter(
+    "applications_total",
+    "Applications submitted, by the way they were submitted (http, browser).",
+    ("method",),
+)
+
+# Time spent in the phases marked with profiler.phase_timer
+phase_seconds = Counter(
+    "phase_seconds_total",
+    "Time spent in each phase of checking and applying.",
+    ("phase",),
+)
+phase_calls = Counter(
+    "phase_calls_total",
+    "Runs of each phase of checking and applying.",
+    ("phase",),
+)
+
+# Browser
+webdriver_commands = Counter(
+    "webdriver_commands_total",
+    "WebDriver round trips to Chrome, by command.",
+    ("command",),
+)
+chrome_rss = Gauge(
+    "chrome_rss_bytes",
+    "Resident memory of chromedriver and all Chrome processes started by it.",
+)
+
+# Background work and storage
+queue_depth = Gauge(
+    "queue_depth",
+    "Jobs waiting in the background queues, by queue.",
+    ("queue",),
+)
+queue_depth.set_function(notification_dispatcher.dispatcher.jobs.qsize, queue="notifications")
+queue_depth.set_function(
+    lambda: sum(
+        sender.events.qsize() for sender in list(discord_notifications.discord_senders.values())
+    ),
+    queue="discord",
+)
+application_log_size = Gauge(
+    "application_log_bytes",
+    "Size of the application log (successful_applications.jsonl).",
+)
+application_log_size.set_function(
+    lambda: os.path.getsize(constants.log_file_path)
+    if os.path.isfile(constants.log_file_path)
+    else 0
+)
+
+
+def track_webdriver(web_driver):
+    """
+    Count every WebDriver command the driver (and its elements) sends to Chrome.
+    """
+
+    execute = web_driver.execute
+
+    def counted_execute(driver_command, params=None):
+        webdriver_commands.inc(command=driver_command)
+        return execute(driver_command, params)
+
+    web_driver.execute = counted_execute
+    return web_driver
+
+
+def process_tree_rss(pid: int):
+    """
+    Resident memory of a process and all of its descendants, in bytes.
+
+    Read from /proc, so only available on Linux.
+
+    Returns:
+        int: The resident memory, or None if it can't be read.
+    """
+
+    if not os.path.isdir("/proc"):
+        return None
+
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as stat:
+                # The process name may contain spaces and parentheses, the fields start after the last ')'
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm", "r") as statm:
+                total += int(statm.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        pending.extend(children.get(current, []))
+    return total
+
+
+def watch_chrome(chrome_driver_instance):
+    """
+    Expose the memory of the Chrome started by a ChromeDriverConfigurator (nothing while it isn't running).
+    """
+
+    def read_rss():
+        if not chrome_driver_instance.is_started():
+            return None
+        process = getattr(chrome_driver_instance.driver.service, "process", None)
+        if process is None:
+            return None
+        return process_tree_rss(process.pid)
+
+    chrome_rss.set_function(read_rss)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics on '/metrics'.
+    """
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would flood the bot's log
+        pass
+
+
+def start_server(port: int, host: str = constants.metrics_host):
+    """
+    Serve the metrics on 'http://<host>:<port>/metrics' from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The server, or None if it could not be started (the bot runs on without it).
+    """
+
+    global server
+    if server is not None:
+        return server
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        LOG.error(color_me.red(f"Failed to start the metrics endpoint on {host}:{port}: {e} ❌"))
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    LOG.info(color_me.cyan(f"Serving metrics on http://{host}:{port}/metrics 📈"))
+    return server
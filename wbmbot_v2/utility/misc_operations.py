@@ -1,22 +1,66 @@
 import re
 
-import requests
+from utility import keyword_filter, profiler
 
 
 def contains_filter_keywords(flat_elem, user_filters):
-    """Check if the flat contains any of the exclude keywords and return the keywords."""
+    """
+    Check if the flat contains any of the exclude keywords and return the keywords.
+
+    'user_filters' is either a compiled KeywordFilter or a plain list of keywords.
+    """
+
+    if not isinstance(user_filters, keyword_filter.KeywordFilter):
+        user_filters = keyword_filter.KeywordFilter(user_filters)
 
-    # Find all keywords that are in the flat_elem's text
-    keywords_found = [
-        keyword
-        for keyword in user_filters
-        if str(keyword).strip().lower() in flat_elem.text.lower()
-    ]
+    # Find all keywords that are in the flat_elem's text, in a single pass
+    keywords_found = user_filters.find_all(flat_elem.text)
 
     # Return a tuple of boolean and keywords found
     return (bool(keywords_found), keywords_found)
 
 
+@profiler.phase_timer("criteria")
+def evaluate_flat_criteria(flat_elem, flat_obj, user_profile):
+    """
+    Check a flat against all of the user's criteria at once.
+
+    Returns:
+        tuple: (bool: whether the flat matches all criteria,
+                str: the criterion it fails ('exclude_keyword', 'rent', 'size' or 'rooms'), "" if it matches,
+                str: why it doesn't match, "" if it does)
+    """
+
+    excluded, keywords_found = contains_filter_keywords(
+        flat_elem, user_profile.exclude_filter
+    )
+    if excluded:
+        return (False, "exclude_keyword", f"it contains exclude keyword(s) --> {keywords_found}")
+
+    if not verify_flat_rent(flat_obj.total_rent, user_profile.flat_rent_below):
+        return (
+            False,
+            "rent",
+            f"the rent doesn't match our criteria --> Flat Rent: {flat_obj.total_rent} € | User wants it below: {user_profile.flat_rent_below} €",
+        )
+
+    if not verify_flat_size(flat_obj.size, user_profile.flat_size_above, flat_obj.wbs):
+        return (
+            False,
+            "size",
+            f"the size doesn't match our criteria --> Flat Size: {flat_obj.size} m² | User wants it above: {user_profile.flat_size_above} m²",
+        )
+
+    if not verify_flat_rooms(flat_obj.rooms, user_profile.flat_rooms_above):
+        return (
+            False,
+            "rooms",
+            f"the rooms don't match our criteria --> Flat Rooms: {flat_obj.rooms} | User wants it above: {user_profile.flat_rooms_above}",
+        )
+
+    return (True, "", "")
+
+
 def verify_flat_rent(flat_rent, user_flat_rent):
     """Check if the flat rent is <= the user specified flat rent."""
 
@@ -68,29 +112,6 @@ def verify_flat_rooms(flat_rooms, user_flat_rooms):
         return False
 
 
-def check_internet_connection():
-    """
-    Check internet connection by sending a GET request to www.google.com using HTTPS.
-
-    Returns:
-        bool: True if internet connection is available, False otherwise.
-    """
-
-    try:
-        response = requests.get("https://www.google.com", timeout=1)
-        return response.status_code in [200, 201, 204]
-    except requests.Timeout:
-        return False
-    except requests.ConnectionError:
-        return False
-    except requests.TooManyRedirects:
-        return False
-    except requests.InvalidURL:
-        return False
-    except requests.RequestException:
-        return False
-
-
 def convert_rent(rent_text: str) -> str:
     """
     Convert a rent string to a numerical value.
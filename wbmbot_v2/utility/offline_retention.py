@@ -0,0 +1,306 @@
+import glob
+import gzip
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers import constants
+from logger import wbm_logger
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+# Directory (inside the Angebote archive) of the content-addressed assets, see httpPageArchiver
+ASSETS_DIR = "assets"
+# Asset references inside an archived page
+ASSET_REFERENCE_RE = re.compile(rb"assets/([0-9a-f]{64}(?:\.[a-z]+)?)")
+# Temporary files of interrupted writes are removed once they are this old (seconds)
+STALE_PART_AGE = 60 * 60
+
+# The running compactor, the bot restarting itself keeps it
+compactor = None
+
+
+def digest_file(path: str) -> str:
+    """
+    SHA-256 hex digest of a file's content.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(constants.download_chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compress_legacy_snapshot(folder: str, archive_dir: str):
+    """
+    Replace a per-run pywebcopy folder by the gzip-compressed HTML of its page (process pool).
+
+    The compressed page is named after its content hash, so duplicate snapshots are
+    only kept once, and keeps the folder's modification time for the retention.
+
+    Returns:
+        str | None: The path of the compressed page, or None if the folder had no page.
+    """
+
+    html_files = glob.glob(os.path.join(folder, "**", "*.html"), recursive=True)
+    modified = os.path.getmtime(folder)
+
+    page_path = None
+    if html_files:
+        # The page itself, pywebcopy also saves small HTML assets (iframes, ...) next to it
+        with open(max(html_files, key=os.path.getsize), "rb") as html_file:
+            content = html_file.read()
+        page_path = os.path.join(
+            archive_dir, f"{hashlib.sha256(content).hexdigest()}.html.gz"
+        )
+        if not os.path.isfile(page_path):
+            temp_path = f"{page_path}.{os.getpid()}.part"
+            with open(temp_path, "wb") as page_file:
+                page_file.write(gzip.compress(content))
+            os.replace(temp_path, page_path)
+            os.utime(page_path, (modified, modified))
+
+    shutil.rmtree(folder)
+    return page_path
+
+
+def store_legacy_pdf(pdf_path: str, pdf_dir: str) -> str:
+    """
+    Move a PDF of a per-run folder into the content-addressed PDF store (process pool).
+
+    A PDF that is stored already is deleted instead.
+
+    Returns:
+        str: The path of the stored PDF.
+    """
+
+    stored_path = os.path.join(pdf_dir, f"{digest_file(pdf_path)}.pdf")
+    if os.path.isfile(stored_path):
+        os.remove(pdf_path)
+    else:
+        os.replace(pdf_path, stored_path)
+    return stored_path
+
+
+def referenced_assets(page_path: str) -> set:
+    """
+    File names of the stored assets an archived page references (process pool).
+    """
+
+    try:
+        with gzip.open(page_path, "rb") as page_file:
+            content = page_file.read()
+    except (OSError, EOFError):
+        return set()
+    return {name.decode() for name in ASSET_REFERENCE_RE.findall(content)}
+
+
+def list_files(directory: str, pattern: str) -> list:
+    """
+    The files directly inside a directory matching a glob pattern, as (path, mtime, size), oldest first.
+    """
+
+    files = []
+    for path in glob.glob(os.path.join(directory, pattern)):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if os.path.isfile(path):
+            files.append((path, stat.st_mtime, stat.st_size))
+    return sorted(files, key=lambda file: file[1])
+
+
+def remove_stale_parts(directories: list):
+    """
+    Remove the temporary files of writes that were interrupted by a crash.
+    """
+
+    for directory in directories:
+        parts = list_files(directory, "*.part") + list_files(directory, ".*.part")
+        for path, modified, _ in parts:
+            if time.time() - modified > STALE_PART_AGE:
+                os.remove(path)
+
+
+class OfflineViewingsCompactor:
+    """
+    Keeps the size of 'offline_viewings' in check.
+
+    A compaction run:
+
+        1. Compresses the per-run pywebcopy folders of older versions into single
+           '<hash>.html.gz' pages and moves per-run PDFs into the content-addressed
+           PDF store, in parallel in a process pool. Duplicates are dropped on the way.
+        2. Deletes archived pages older than 'offline_max_age_days', then the oldest
+           ones until the archive fits into 'offline_max_size_mb'.
+        3. Deletes stored assets that no remaining page references.
+
+    Expose PDFs are only downloaded when we apply to a flat, they are the record of our
+    applications and are kept (only de-duplicated) unless 'offline_keep_applied_pdfs' is off.
+    """
+
+    def __init__(self, angebote_dir: str, pdf_dir: str):
+        """
+        Create the compactor
+
+        Parameters:
+            angebote_dir (str): The directory of the archived Angebote pages.
+            pdf_dir (str): The directory of the expose PDFs.
+        """
+        self.angebote_dir = angebote_dir
+        self.assets_dir = os.path.join(angebote_dir, ASSETS_DIR)
+        self.pdf_dir = pdf_dir
+        self.thread = None
+
+    def compact_legacy(self, pool):
+        """
+        Compress the per-run folders of older versions (step 1).
+        """
+
+        folders = [
+            folder
+            for folder in glob.glob(os.path.join(self.angebote_dir, "*", ""))
+            if os.path.normpath(folder) != os.path.normpath(self.assets_dir)
+        ]
+        list(
+            pool.map(
+                compress_legacy_snapshot,
+                folders,
+                [self.angebote_dir] * len(folders),
+            )
+        )
+
+        pdfs = glob.glob(os.path.join(self.pdf_dir, "*", "**", "*.pdf"), recursive=True)
+        list(pool.map(store_legacy_pdf, pdfs, [self.pdf_dir] * len(pdfs)))
+        for folder in glob.glob(os.path.join(self.pdf_dir, "*", "")):
+            shutil.rmtree(folder, ignore_errors=True)
+
+        if folders or pdfs:
+            LOG.info(
+                color_me.cyan(
+                    f"Compacted {len(folders)} old page folder(s) and {len(pdfs)} old PDF(s) 🗜️"
+                )
+            )
+
+    def apply_retention(self) -> int:
+        """
+        Delete the files that are too old, then the oldest ones while the archive is too big (step 2).
+
+        Returns:
+            int: The number of deleted files.
+        """
+
+        deletable = list_files(self.angebote_dir, "*.html.gz")
+        kept_size = sum(size for _, _, size in list_files(self.assets_dir, "*"))
+        pdfs = list_files(self.pdf_dir, "*.pdf")
+        if constants.offline_keep_applied_pdfs:
+            kept_size += sum(size for _, _, size in pdfs)
+        else:
+            deletable = sorted(deletable + pdfs, key=lambda file: file[1])
+
+        oldest_allowed = time.time() - constants.offline_max_age_days * 24 * 60 * 60
+        max_size = constants.offline_max_size_mb * 1024 * 1024
+        total_size = kept_size + sum(size for _, _, size in deletable)
+
+        deleted = 0
+        for path, modified, size in deletable:
+            if modified >= oldest_allowed and total_size <= max_size:
+                break
+            os.remove(path)
+            total_size -= size
+            deleted += 1
+        return deleted
+
+    def prune_assets(self, pool) -> int:
+        """
+        Delete the stored assets that no archived page references anymore (step 3).
+
+        Returns:
+            int: The number of deleted assets.
+        """
+
+        pages = [path for path, _, _ in list_files(self.angebote_dir, "*.html.gz")]
+        referenced = set().union(*pool.map(referenced_assets, pages))
+
+        deleted = 0
+        for path, modified, _ in list_files(self.assets_dir, "*"):
+            name = os.path.basename(path)
+            # Recently stored assets may belong to a page that is being archived right now
+            if name == "index.json" or name in referenced or time.time() - modified < STALE_PART_AGE:
+                continue
+            os.remove(path)
+            deleted += 1
+        return deleted
+
+    def compact(self):
+        """
+        Run a compaction (see the class description).
+        """
+
+        if not os.path.isdir(self.angebote_dir) and not os.path.isdir(self.pdf_dir):
+            return
+
+        started = time.monotonic()
+        remove_stale_parts([self.angebote_dir, self.assets_dir, self.pdf_dir])
+        # 'spawn', forking the bot's threads (browser, notifications, ...) isn't safe
+        with ProcessPoolExecutor(
+            max_workers=constants.offline_compaction_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            self.compact_legacy(pool)
+            deleted_files = self.apply_retention()
+            deleted_assets = self.prune_assets(pool)
+
+        LOG.info(
+            color_me.cyan(
+                f"Offline viewings compacted in {time.monotonic() - started:.1f}s, "
+                f"deleted {deleted_files} old file(s) and {deleted_assets} unused asset(s) 🧹"
+            )
+        )
+
+    def run(self):
+        """
+        Compact now and then every 'offline_compaction_interval' seconds.
+        """
+
+        while True:
+            try:
+                self.compact()
+            except Exception as e:
+                LOG.error(color_me.red(f"Failed to compact the offline viewings: {e} ❌"))
+            time.sleep(constants.offline_compaction_interval)
+
+    def start(self):
+        """
+        Start compacting in a background thread.
+        """
+
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name="offline-compactor", daemon=True
+            )
+            self.thread.start()
+
+
+def start_compactor(angebote_dir: str, pdf_dir: str) -> OfflineViewingsCompactor:
+    """
+    Start compacting 'offline_viewings' in the background, only once per process.
+
+    Returns:
+        OfflineViewingsCompactor: The running compactor.
+    """
+
+    global compactor
+    if compactor is None:
+        compactor = OfflineViewingsCompactor(angebote_dir, pdf_dir)
+        compactor.start()
+    return compactor
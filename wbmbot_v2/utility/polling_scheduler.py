@@ -0,0 +1,142 @@
+import datetime as dt
+import json
+import os
+import random
+import time
+
+from helpers import constants
+from logger import wbm_logger
+from utility import file_lock, profiler
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+WEEKDAYS = 7
+HOURS = 24
+
+
+class PollingScheduler:
+    """
+    Decides how long to wait before the next check, from when new flats appeared in the past.
+
+    The number of new listings seen is counted per weekday and hour and kept on disk.
+    Hours in which more flats than average appeared are checked more often (down to
+    'interval / poll_max_speedup'), quiet hours (e.g. nights) less often (up to
+    'interval * poll_max_slowdown'). All intervals of a day are scaled so that the
+    day stays within 'poll_budget_per_day' checks, by default as many as a fixed
+    interval would make. Every wait gets a random jitter of +/- 'poll_jitter'.
+
+    Without any history yet, the interval is used as it is. Several bot processes can
+    share the history, every bot adds its new listings to the counts on disk under a lock.
+    """
+
+    def __init__(self, interval_minutes, history_file: str, adaptive: bool = True):
+        """
+        Create the scheduler
+
+        Parameters:
+            interval_minutes (int): The base interval between checks, in minutes (--interval).
+            history_file (str): The path of the JSON file with the listing history.
+            adaptive (bool): If False, always wait the base interval (test-run).
+        """
+        self.interval = int(interval_minutes) * 60
+        self.history_file = history_file
+        self.adaptive = adaptive
+        self.budget = constants.poll_budget_per_day or (
+            HOURS * 60 * 60 / max(self.interval, 1)
+        )
+        # New listings seen per [weekday][hour]
+        self.new_listings = self.load_history()
+
+    def load_history(self) -> list:
+        """
+        Load the listing history, or start an empty one.
+        """
+
+        try:
+            with open(self.history_file, "r", encoding="utf-8") as history:
+                new_listings = json.load(history)["new_listings"]
+            if len(new_listings) == WEEKDAYS and all(len(day) == HOURS for day in new_listings):
+                return new_listings
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            pass
+        return [[0] * HOURS for _ in range(WEEKDAYS)]
+
+    def save_history(self):
+        """
+        Save the listing history, through a temporary file so it is never half-written.
+        """
+
+        temp_path = f"{self.history_file}.part"
+        with open(temp_path, "w", encoding="utf-8") as history:
+            json.dump({"new_listings": self.new_listings}, history)
+        os.replace(temp_path, self.history_file)
+
+    def record(self, new_listings: int, when: dt.datetime = None):
+        """
+        Record how many new listings a check found.
+        """
+
+        if not new_listings:
+            return
+        when = when or dt.datetime.now()
+        try:
+            with file_lock.locked(self.history_file):
+                # Count on top of what other bots recorded since we loaded the history
+                self.new_listings = self.load_history()
+                self.new_listings[when.weekday()][when.hour] += new_listings
+                self.save_history()
+        except OSError as e:
+            LOG.warning(color_me.yellow(f"Failed to save the listing history: {e} ⚠️"))
+
+    def activity(self, weekday: int, hour: int) -> float:
+        """
+        How busy an hour is compared to an average hour (1.0), clamped to the allowed speed-up/slow-down.
+        """
+
+        total = sum(map(sum, self.new_listings))
+        # Smoothed, so a single flat doesn't turn an hour into a peak
+        average = (total + WEEKDAYS * HOURS) / (WEEKDAYS * HOURS)
+        ratio = (self.new_listings[weekday][hour] + 1) / average
+        return min(max(ratio, 1 / constants.poll_max_slowdown), constants.poll_max_speedup)
+
+    def interval_at(self, when: dt.datetime) -> float:
+        """
+        The interval between checks at a given time, in seconds (without jitter).
+        """
+
+        if not self.adaptive or not any(map(any, self.new_listings)):
+            return self.interval
+
+        weekday = when.weekday()
+        # Checks the adaptive intervals would make on that day, scaled down to the budget
+        checks_per_day = sum(
+            60 * 60 * self.activity(weekday, hour) / self.interval for hour in range(HOURS)
+        )
+        scale = max(checks_per_day / self.budget, 1.0)
+
+        interval = self.interval / self.activity(weekday, when.hour) * scale
+        return max(interval, constants.poll_min_interval)
+
+    def next_delay(self) -> float:
+        """
+        Seconds to wait before the next check.
+        """
+
+        interval = self.interval_at(dt.datetime.now())
+        if not self.adaptive:
+            return interval
+        jitter = random.uniform(-constants.poll_jitter, constants.poll_jitter)
+        return max(interval * (1 + jitter), constants.poll_min_interval)
+
+    @profiler.phase_timer("wait")
+    def wait(self):
+        """
+        Sleep until the next check is due.
+        """
+
+        delay = self.next_delay()
+        if self.adaptive:
+            LOG.info(color_me.cyan(f"Next check in {delay / 60:.1f} minute(s) ⏱️"))
+        time.sleep(delay)
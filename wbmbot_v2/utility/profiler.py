@@ -0,0 +1,270 @@
+import atexit
+import cProfile
+import datetime as dt
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from helpers import constants
+from logger import wbm_logger
+from utility import metrics
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+# The running profiling session (--profile), None if not profiling
+session = None
+
+
+def phase_timer(phase: str):
+    """
+    Decorator counting the calls of a function and the time spent in them as a phase.
+
+    Cheap enough to always stay on, the totals are exposed as 'wbmbot_phase_seconds_total'
+    and 'wbmbot_phase_calls_total' and logged per cycle when profiling.
+
+    Parameters:
+        phase (str): The name of the phase.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.phase_seconds.inc(time.perf_counter() - start, phase=phase)
+                metrics.phase_calls.inc(phase=phase)
+
+        return wrapper
+
+    return decorator
+
+
+def collapse_stack(frame) -> str:
+    """
+    A stack in the collapsed form of flame graphs, root first: 'file:function;file:function'.
+    """
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(" ", "_"))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    """
+    Profiles one thread deterministically (cProfile) and by sampling its stack.
+
+    cProfile gives exact call counts and times per function (pstats), the samples
+    give whole stacks (collapsed stacks, for flame graphs). A paused profile records
+    nothing until it is resumed.
+    """
+
+    def __init__(self, name: str):
+        """
+        Create and start the profile in the calling thread
+
+        Parameters:
+            name (str): The name of the profile, used for its file names.
+        """
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.profiler = cProfile.Profile()
+        self.stacks = Counter()
+        self.running = threading.Event()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name="profiler", daemon=True)
+        self.sampler.start()
+        self.resume()
+
+    def sample(self):
+        """
+        Sample the stack of the profiled thread every 'profile_sample_interval' seconds (sampler thread).
+        """
+
+        while not self.stopped.wait(constants.profile_sample_interval):
+            if not self.running.is_set():
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def pause(self):
+        """Stop recording until resumed."""
+
+        self.profiler.disable()
+        self.running.clear()
+
+    def resume(self):
+        """Record again."""
+
+        self.running.set()
+        self.profiler.enable()
+
+    def stop(self):
+        """Stop recording for good."""
+
+        self.pause()
+        self.stopped.set()
+        self.sampler.join()
+
+    def write(self, directory: str):
+        """
+        Write the profile as '<name>.pstats' and '<name>.collapsed'.
+        """
+
+        path = os.path.join(directory, self.name)
+        self.profiler.dump_stats(f"{path}.pstats")
+        with open(f"{path}.collapsed", "w", encoding="utf-8") as collapsed:
+            for stack, count in self.stacks.most_common():
+                collapsed.write(f"{stack} {count}\n")
+
+
+class ProfilingSession:
+    """
+    Writes a profile of every cycle of 'process_flats' and of every 'apply_to_flat' call.
+
+    A cycle runs from one check of the Angebote page to the next, including the wait
+    in between. 'apply_to_flat' calls are profiled on their own, the cycle's profile
+    is paused during them. Only the thread running 'process_flats' is profiled (not
+    the HTTP submitters, downloads or notifications in the background).
+    """
+
+    def __init__(self, directory: str):
+        """
+        Create the session
+
+        Parameters:
+            directory (str): The directory the profiles are written to.
+        """
+        self.directory = directory
+        self.thread_id = None
+        self.cycle = None
+        self.cycles = 0
+        # Profiled calls in the running cycle
+        self.calls = 0
+        self.phases = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def profile_name(self, kind: str) -> str:
+        """A file name for a profile, unique and sorted by time."""
+
+        return f"{dt.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{kind}"
+
+    def finish(self, profile: Profile):
+        """Stop a profile and write it."""
+
+        profile.stop()
+        try:
+            profile.write(self.directory)
+        except OSError as e:
+            LOG.warning(color_me.yellow(f"Failed to write the profile '{profile.name}': {e} ⚠️"))
+
+    def next_cycle(self):
+        """
+        Write the profile of the cycle that ended and start profiling the next one.
+        """
+
+        if self.cycle is not None:
+            self.finish(self.cycle)
+            self.log_phases()
+        self.cycles += 1
+        self.calls = 0
+        self.thread_id = threading.get_ident()
+        self.phases = metrics.phase_seconds.snapshot()
+        self.cycle = Profile(self.profile_name(f"cycle_{self.cycles:05d}"))
+
+    def log_phases(self):
+        """
+        Show the time spent in each phase during the cycle that ended.
+        """
+
+        spent = {
+            phase: seconds - self.phases.get(phase, 0.0)
+            for phase, seconds in metrics.phase_seconds.snapshot().items()
+        }
+        summary = ", ".join(
+            f"{phase[0]} {seconds:.2f}s"
+            for phase, seconds in sorted(spent.items(), key=lambda item: -item[1])
+            if seconds > 0
+        )
+        LOG.info(
+            color_me.cyan(f"Profiled cycle {self.cycles} -> '{self.cycle.name}' ({summary or 'no phases'}) 🔬")
+        )
+
+    def profile_call(self, name: str, func, *args, **kwargs):
+        """
+        Run 'func(*args, **kwargs)' in a profile of its own.
+        """
+
+        if self.cycle is not None:
+            self.cycle.pause()
+        self.calls += 1
+        call = Profile(self.profile_name(f"cycle_{self.cycles:05d}_{name}_{self.calls:03d}"))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.finish(call)
+            if self.cycle is not None:
+                self.cycle.resume()
+
+    def close(self):
+        """
+        Write the profile of the running cycle.
+        """
+
+        if self.cycle is not None and self.cycle.thread_id == threading.get_ident():
+            self.finish(self.cycle)
+            self.cycle = None
+
+
+def enable(directory: str = constants.profile_path):
+    """
+    Start profiling (--profile), the profiles are written to 'directory'.
+    """
+
+    global session
+    if session is not None:
+        return
+    session = ProfilingSession(directory)
+    atexit.register(session.close)
+    LOG.info(color_me.cyan(f"Profiling every cycle to '{directory}' 🔬"))
+
+
+def next_cycle():
+    """
+    Start the next cycle of 'process_flats', only does something when profiling.
+    """
+
+    if session is not None:
+        session.next_cycle()
+
+
+def profiled(name: str):
+    """
+    Decorator writing a profile of every call of a function, only when profiling.
+
+    Calls from other threads than the one running 'process_flats' are not profiled.
+
+    Parameters:
+        name (str): The name given to the profiles of the calls.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if session is None or session.thread_id != threading.get_ident():
+                return func(*args, **kwargs)
+            return session.profile_call(name, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
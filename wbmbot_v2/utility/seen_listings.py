@@ -0,0 +1,116 @@
+import datetime as dt
+import json
+import os
+
+from helpers import constants
+from logger import wbm_logger
+from utility import file_lock
+
+__appname__ = os.path.splitext(os.path.basename(__file__))[0]
+color_me = wbm_logger.ColoredLogger(__appname__)
+LOG = color_me.create_logger()
+
+
+class SeenListings:
+    """
+    Persistent index of the listings we have seen, with the time each was first seen.
+
+    Several bot processes can share the index: it is saved under a lock, merged with
+    the listings the other bots saved in the meantime.
+
+    Attributes:
+        index_file (str): The path of the JSON index file.
+        first_seen (dict): Listing key -> ISO timestamp of when it was first seen.
+    """
+
+    def __init__(self, index_file: str):
+        """
+        Load the index, or start an empty one
+
+        Parameters:
+            index_file (str): The path of the JSON index file.
+        """
+        self.index_file = index_file
+        self.first_seen = self.load()
+
+    def load(self) -> dict:
+        """
+        Load the index from disk.
+        """
+
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as index:
+                first_seen = json.load(index)
+            if isinstance(first_seen, dict):
+                return first_seen
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            LOG.warning(color_me.yellow("Failed to parse the seen listings index, starting a new one ⚠️"))
+        return {}
+
+    def save(self):
+        """
+        Save the index, through a temporary file so it is never half-written.
+        """
+
+        temp_path = f"{self.index_file}.part"
+        with open(temp_path, "w", encoding="utf-8") as index:
+            json.dump(self.first_seen, index, ensure_ascii=False)
+        os.replace(temp_path, self.index_file)
+
+    def is_empty(self) -> bool:
+        """Whether no listing was seen yet (first run)."""
+
+        return not self.first_seen
+
+    def is_known(self, key: str) -> bool:
+        """Whether a listing was seen before."""
+
+        return key in self.first_seen
+
+    def first_seen_at(self, key: str, default: dt.datetime = None) -> dt.datetime:
+        """When a listing was first seen, or 'default' if it was never seen."""
+
+        if key not in self.first_seen:
+            return default
+        return dt.datetime.fromisoformat(self.first_seen[key])
+
+    def mark(self, keys, when: dt.datetime = None):
+        """
+        Mark listings as seen and save the index if any of them is new.
+
+        Entries older than 'seen_listings_max_age_days' that are not listed anymore are dropped.
+
+        Parameters:
+            keys (iterable of str): The keys of the listings currently listed.
+            when (datetime): When the listings were seen, defaults to now.
+        """
+
+        keys = set(keys)
+        new_keys = keys.difference(self.first_seen)
+        if not new_keys:
+            return
+
+        when = when or dt.datetime.now()
+        for key in new_keys:
+            self.first_seen[key] = when.isoformat(timespec="seconds")
+
+        oldest_allowed = (
+            when - dt.timedelta(days=constants.seen_listings_max_age_days)
+        ).isoformat(timespec="seconds")
+
+        try:
+            with file_lock.locked(self.index_file):
+                # Keep what other bots saved since we loaded the index, the earliest time wins
+                for key, first_seen in self.load().items():
+                    if key not in self.first_seen or first_seen < self.first_seen[key]:
+                        self.first_seen[key] = first_seen
+                self.first_seen = {
+                    key: first_seen
+                    for key, first_seen in self.first_seen.items()
+                    if key in keys or first_seen >= oldest_allowed
+                }
+                self.save()
+        except OSError as e:
+            LOG.warning(color_me.yellow(f"Failed to save the seen listings index: {e} ⚠️"))